@@ -1,234 +1,437 @@
-import pygame
-from constants import SCREEN_WIDTH, SCREEN_HEIGHT, BACKGROUND_IMG_PATH, CHESSBOARD_IMG_PATH, PIECE_IMAGE_SCALE
-from pieces import is_valid_move, look_for_check, is_legal_move
-from board import create_starting_board, get_board_coords
-from gameui import show_pawn_promotion_menu, draw_promotion_menu
-
-pygame.init()
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-clock = pygame.time.Clock()  # For delta time
-
-background_img = pygame.image.load(BACKGROUND_IMG_PATH).convert_alpha()
-background_img = pygame.transform.scale(background_img, (SCREEN_WIDTH, SCREEN_HEIGHT))
-chessboard_img = pygame.image.load(CHESSBOARD_IMG_PATH).convert_alpha()
-chessboard_img = pygame.transform.scale(chessboard_img, (700, 500))
-
-screen_rect = screen.get_rect()
-chessboard_rect = chessboard_img.get_rect()
-chessboard_rect.center = screen_rect.center
-
-square_width = chessboard_rect.width // 8
-square_height = chessboard_rect.height // 8
-
-def update_sprite_positions(board_state, flip=False):
-    group = pygame.sprite.Group()
-    for row in range(8):
-        for col in range(8):
-            piece = board_state[row][col]
-            if piece:
-                draw_row = 7 - row if flip else row
-                draw_col = 7 - col if flip else col
-                x = chessboard_rect.left + draw_col * square_width + 25
-                y = chessboard_rect.top + draw_row * square_height
-                piece.rect.topleft = (x, y)
-                group.add(piece)
-    return group
-
-def apply_promotion(board_state, all_sprites, pos, color, new_type, turn):
-    if pos is None:
-        return
-    r, c = pos
-    pawn = board_state[r][c]
-    if pawn is None:
-        return
-    if getattr(pawn, "type", None) != "pawn":
-        return
-    
-    # Change piece type
-    pawn.type = new_type
-    
-   
-    img_path = f"assets/{color}_{new_type}.png"
-    try:
-        new_img = pygame.image.load(img_path).convert_alpha()
-        pawn.image = pygame.transform.scale(new_img, PIECE_IMAGE_SCALE)  # (40, 50)
-        pawn.rect = pawn.image.get_rect()  # Create new rect from scaled image
-    except Exception as e:
-        print("Failed to load promoted image:", img_path, e)
-        return
-    
-    # Recalculate ALL piece positions with correct flip state
-    flip_view = (turn % 2 == 1)
-    refreshed = update_sprite_positions(board_state, flip_view)
-    all_sprites.empty()
-    for spr in refreshed:
-        all_sprites.add(spr)
-
-board_state = create_starting_board()
-all_sprites = update_sprite_positions(board_state)
-
-selected_piece = None
-turn = 0
-running = True
-
-promotion_menu_active = False
-promoting_color = None
-promoting_pos = None
-promotion_buttons = []
-promotion_menu_rect = None
-promotion_buttons_ready = False
-
-
-en_passant_target = None
-en_passant_turn = -1
-
-# Castling Flags
-white_king_has_moved = False
-white_kingside_rook_has_moved = False   
-white_queenside_rook_has_moved = False  
-black_king_has_moved = False
-black_kingside_rook_has_moved = False   
-black_queenside_rook_has_moved = False 
-
-while running:
-    dt = clock.tick(60)  
-    flip_view = (turn % 2 == 1)  
-    mouse_pos = pygame.mouse.get_pos()
-
-    # Update button hover states
-    if promotion_menu_active and promotion_buttons:
-        for btn in promotion_buttons:
-            btn.update(mouse_pos, dt)
-
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            if promotion_menu_active:
-                for btn in promotion_buttons:
-                    if btn.handle_click(mouse_pos):
-                        apply_promotion(board_state, all_sprites, promoting_pos, promoting_color, btn.piece_name, turn)
-                        promotion_menu_active = False
-                        promoting_color = None
-                        promoting_pos = None
-                        promotion_buttons = []
-                        promotion_menu_rect = None
-                        promotion_buttons_ready = False
-                        turn += 1
-                        flip_view = (turn % 2 == 1)
-                        all_sprites = update_sprite_positions(board_state, flip_view)
-                        break
-                continue  # Skip normal selection while menu open
-
-            row, col = get_board_coords(mouse_pos, chessboard_rect, square_width, square_height, flip_view)
-            for sprite in all_sprites:
-                if sprite.rect.collidepoint(mouse_pos):
-                    if (turn % 2 == 0 and sprite.color == "white") or (turn % 2 == 1 and sprite.color == "black"):
+"""
+Chess game
+The pygame front end. Importing this module loads only the rules, engine and
+I/O modules; pygame, the window and the piece images are set up when main()
+runs, so tools and worker processes that import from the project never pay
+for them.
+
+    python ChessGame.py
+    python ChessGame.py --profile profile.json --cprofile game.prof
+"""
+import argparse
+import os
+import sys
+import time
+
+from constants import (SCREEN_WIDTH, SCREEN_HEIGHT, BACKGROUND_IMG_PATH, CHESSBOARD_IMG_PATH, PIECE_ATLAS, PIECE_IMAGE_SCALE,
+                       PROMOTION_IMAGE_SCALE, BOOK_PATH, ENGINE_MOVETIME, ANALYSIS_PANEL_WIDTH, ANALYSIS_LINES, PONDER,
+                       HUD_REFRESH_SECONDS, PROFILE_PATH)
+from book import open_book
+from tablebase import open_tablebases, format_result, TABLEBASE_DIR
+from uci import EngineProcess
+from notation import move_to_san
+from pieces import generate_legal_moves, game_status, ONGOING, CHECKMATE
+from profiling import Profiler
+from position import PAWN, PIECE_TYPES, piece_type, piece_color, square, encode_move, make_move
+from record import GameRecord
+
+def format_score(line, white_to_move):
+    """Score of an AnalysisLine from white's point of view: +0.35, #3 or #-3."""
+    sign = 1 if white_to_move else -1
+    if line.mate is not None:
+        return f"#{line.mate * sign}"
+    return f"{line.cp * sign / 100:+.2f}"
+
+def analysis_rows(board_state, lines):
+    """(score, moves in SAN) for each line of the current search, best first."""
+    rows = []
+    for rank in sorted(lines):
+        line = lines[rank]
+        position = board_state.copy()
+        san = []
+        for move in line.pv:
+            if move not in generate_legal_moves(position):
+                break
+            san.append(move_to_san(position, move))
+            make_move(position, move)
+        if san:
+            rows.append((format_score(line, board_state.side_to_move == 0), f"{line.depth}: " + " ".join(san)))
+    return rows
+
+def hud_lines(profiler):
+    """Text of the performance HUD: frame percentiles, work per frame, validation latency and engine speed."""
+    stats = profiler.stats
+    frame = stats.get("frame")
+    lines = ["frame " + (" ".join(f"p{int(p * 100)} {frame.percentile(p) * 1e3:.1f}" for p in (0.5, 0.95, 0.99))
+                         + " ms" if frame else "-")]
+    work = [(label, stats[name]) for name, label in (("events", "ui"), ("engine io", "engine"), ("render", "draw"))
+            if name in stats]
+    lines.append("p50 " + " ".join(f"{label} {stat.percentile(0.5) * 1e3:.2f}" for label, stat in work) + " ms")
+    validate = stats.get("LegalMoveCache.targets")
+    movegen = stats.get("generate_legal_moves")
+    lines.append(f"validate p50 {validate.percentile(0.5) * 1e6:.1f} p99 {validate.percentile(0.99) * 1e6:.1f} us"
+                 if validate and validate.count else "validate -")
+    lines.append(f"movegen p50 {movegen.percentile(0.5) * 1e6:.0f} us, {movegen.count} calls"
+                 if movegen and movegen.count else "movegen -")
+    nps = profiler.gauges.get("engine nps")
+    lines.append(f"engine {nps:,} nps" if nps else "engine idle")
+    return lines
+
+def open_engine():
+    return EngineProcess({"BookFile": os.path.abspath(BOOK_PATH), "TablebasePath": os.path.abspath(TABLEBASE_DIR)})
+
+
+def main(argv=None):
+    """Open the window and run the game until it is closed."""
+    parser = argparse.ArgumentParser(description="Play chess")
+    parser.add_argument("--profile", metavar="JSON", help="collect timings from the start and write them here on exit")
+    parser.add_argument("--cprofile", metavar="PROF", help="also run cProfile and write its stats here on exit")
+    args = parser.parse_args(argv)
+
+    import pygame
+    from assets import preload_piece_images
+    from board import (create_starting_board, create_sprites, get_board_coords, play_move, take_back,
+                       square_origin, square_topleft, update_sprite_positions, LegalMoveCache)
+    from gameui import (show_pawn_promotion_menu, draw_promotion_menu, centered_menu_rect, render_text, MENU_SIZE,
+                        make_target_markers, show_target_markers, draw_analysis_panel, draw_hud, HUD_HEIGHT)
+
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH + ANALYSIS_PANEL_WIDTH, SCREEN_HEIGHT))
+    clock = pygame.time.Clock()  # For delta time
+
+    background_img = pygame.image.load(BACKGROUND_IMG_PATH).convert_alpha()
+    background_img = pygame.transform.scale(background_img, screen.get_size())
+    chessboard_img = pygame.image.load(CHESSBOARD_IMG_PATH).convert_alpha()
+    chessboard_img = pygame.transform.scale(chessboard_img, (700, 500))
+
+    screen_rect = screen.get_rect()
+    chessboard_rect = chessboard_img.get_rect()
+    chessboard_rect.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+    panel_rect = pygame.Rect(SCREEN_WIDTH, chessboard_rect.top, ANALYSIS_PANEL_WIDTH - 20, chessboard_rect.height)
+    # The panel holds the analysis lines and, under them, the performance HUD
+    analysis_rect = pygame.Rect(panel_rect.topleft, (panel_rect.width, panel_rect.height - HUD_HEIGHT))
+    hud_rect = pygame.Rect(panel_rect.left, analysis_rect.bottom, panel_rect.width, HUD_HEIGHT)
+
+    square_width = chessboard_rect.width // 8
+    square_height = chessboard_rect.height // 8
+
+    # Static backdrop composed once; the renderer restores it under moving sprites
+    background = background_img.copy()
+    background.blit(chessboard_img, chessboard_rect.topleft)
+    panel_shade = pygame.Surface(panel_rect.size)
+    panel_shade.fill((0, 0, 0))
+    panel_shade.set_alpha(110)
+    background.blit(panel_shade, panel_rect)
+
+    # Retained promotion menu surfaces: the dimming overlay and the saved board under the menu
+    overlay = pygame.Surface(screen.get_size())
+    overlay.fill((0, 0, 0))
+    overlay.set_alpha(128)
+    menu_backdrop = pygame.Surface(MENU_SIZE).convert()
+
+    # Decode every piece image once so neither startup sprites nor promotions hit the disk
+    preload_piece_images(PIECE_IMAGE_SCALE, atlas=PIECE_ATLAS)
+    preload_piece_images(PROMOTION_IMAGE_SCALE)
+
+    game = GameRecord(create_starting_board())
+    board_state = game.position
+    sprites = create_sprites(board_state)
+    all_sprites = pygame.sprite.LayeredDirty()
+    all_sprites.clear(screen, background)
+    update_sprite_positions(sprites, all_sprites, chessboard_rect)
+
+    # Legal moves are generated once per position and shared by picking, dropping,
+    # the target markers and engine replies
+    legal_moves = LegalMoveCache()
+    target_markers = make_target_markers((square_width, square_height), all_sprites)
+
+    # Opening book for the side to move (B plays a book move); None when there is no book file
+    book = open_book(BOOK_PATH)
+
+    # T toggles a line under the board with the tablebase result of the current position
+    tablebases = open_tablebases()
+    show_result = False
+    result_rect = pygame.Rect(chessboard_rect.left, chessboard_rect.bottom + 5, chessboard_rect.width, 40)
+    result_text = None
+    status = ONGOING
+    status_ply = None
+
+    # E hands the side to move to the engine, which runs as a separate UCI process.
+    # It ponders on the player's time, and A shows its best lines for the side to move.
+    engine = None
+    engine_color = None
+    engine_search = None
+    # (ply, key, move): the reply the engine expects in the position after its last move
+    expected_reply = None
+    analysis = False
+    panel_state = None
+
+    selected_piece = None
+    running = True
+
+    promotion_menu_active = False
+    promoting_color = None
+    promoting_move = None
+    promotion_buttons = []
+    promotion_menu_rect = None
+    promotion_buttons_ready = False
+
+    # F3 shows the HUD and collects timings, F4 writes them to PROFILE_PATH
+    profiler = Profiler()
+    if args.profile or args.cprofile:
+        profiler.enable(cprofile=bool(args.cprofile))
+    show_hud = False
+    hud_shown = False
+    hud_updated = 0.0
+    frame_start = time.perf_counter()
+
+    # Repaint the whole window on the next frame (startup, menu closing)
+    needs_full_redraw = True
+
+    while running:
+        dt = clock.tick(60)  
+        now = time.perf_counter()
+        profiler.record("frame", now - frame_start)
+        frame_start = now
+        flip_view = (board_state.turn % 2 == 1)  
+        mouse_pos = pygame.mouse.get_pos()
+
+        # Update button hover states
+        if promotion_menu_active and promotion_buttons:
+            for btn in promotion_buttons:
+                btn.update(mouse_pos, dt)
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+
+            elif event.type == pygame.KEYDOWN:
+                # Backspace or U takes back the last move, R plays it again
+                if event.key in (pygame.K_BACKSPACE, pygame.K_u) and not promotion_menu_active and selected_piece is None:
+                    if take_back(game, sprites):
+                        # Against the engine, go back to the player's own move
+                        if engine_color == board_state.side_to_move:
+                            take_back(game, sprites)
+                        flip_view = (board_state.turn % 2 == 1)
+                        update_sprite_positions(sprites, all_sprites, chessboard_rect, flip_view)
+                elif event.key == pygame.K_r and game.can_redo and not promotion_menu_active and selected_piece is None:
+                    play_move(game, sprites, game.redo_moves[-1])
+                    if engine_color == board_state.side_to_move and game.can_redo:
+                        play_move(game, sprites, game.redo_moves[-1])
+                    flip_view = (board_state.turn % 2 == 1)
+                    update_sprite_positions(sprites, all_sprites, chessboard_rect, flip_view)
+                elif event.key == pygame.K_e and not promotion_menu_active and selected_piece is None:
+                    if engine_color is None:
+                        if engine is None:
+                            engine = open_engine()
+                        engine_color = board_state.side_to_move
+                    else:
+                        engine_color = None
+                elif event.key == pygame.K_a:
+                    if engine is None:
+                        engine = open_engine()
+                    analysis = not analysis
+                elif event.key == pygame.K_t:
+                    show_result = not show_result
+                elif event.key == pygame.K_F3:
+                    show_hud = not show_hud
+                    if show_hud:
+                        profiler.enable()
+                    elif not (args.profile or args.cprofile):
+                        profiler.disable()
+                elif event.key == pygame.K_F4 and profiler.enabled:
+                    profiler.dump(PROFILE_PATH)
+                elif event.key == pygame.K_b and book and not promotion_menu_active and selected_piece is None:
+                    book_move = book.choose_move(board_state)
+                    if book_move is not None:
+                        play_move(game, sprites, book_move)
+                        flip_view = (board_state.turn % 2 == 1)
+                        update_sprite_positions(sprites, all_sprites, chessboard_rect, flip_view)
+
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                if promotion_menu_active:
+                    for btn in promotion_buttons:
+                        if btn.handle_click(mouse_pos):
+                            from_sq, to_sq = promoting_move
+                            play_move(game, sprites, encode_move(from_sq, to_sq, PIECE_TYPES[btn.piece_name]))
+                            promotion_menu_active = False
+                            promoting_color = None
+                            promoting_move = None
+                            promotion_buttons = []
+                            promotion_menu_rect = None
+                            promotion_buttons_ready = False
+                            needs_full_redraw = True
+                            flip_view = (board_state.turn % 2 == 1)
+                            update_sprite_positions(sprites, all_sprites, chessboard_rect, flip_view)
+                            break
+                    continue  # Skip normal selection while menu open
+
+                row, col = get_board_coords(mouse_pos, chessboard_rect, square_width, square_height, flip_view)
+                if 0 <= row < 8 and 0 <= col < 8:
+                    sprite = sprites[square(row, col)]
+                    if sprite and piece_color(sprite.code) == board_state.side_to_move != engine_color:
                         selected_piece = sprite
-                        break
-
-        elif event.type == pygame.MOUSEBUTTONUP:
-            if selected_piece and not promotion_menu_active:
-                old_row, old_col = selected_piece.row, selected_piece.col
-                new_row, new_col = get_board_coords(mouse_pos, chessboard_rect, square_width, square_height, flip_view)
-                if 0 <= new_row < 8 and 0 <= new_col < 8:
-                    if is_legal_move(selected_piece, board_state, new_row, new_col, en_passant_target, en_passant_turn, turn):
-                        board_state[old_row][old_col] = None
-
-                        # CHECK FOR EN PASSANT CAPTURE
-                        is_en_passant_capture = False
-                        if selected_piece.type == "pawn" and (new_row, new_col) == en_passant_target:
-                            if turn == en_passant_turn + 1:
-                                is_en_passant_capture = True
-                                
-                                # Calculate where the captured pawn actually is
-                                if selected_piece.color == "white":
-                                    captured_pawn_row = new_row + 1  
-                                else:
-                                    captured_pawn_row = new_row - 1  
-                                
-                                captured_pawn_col = new_col
-                                
-                                # Remove the pawn from its actual location
-                                captured_pawn = board_state[captured_pawn_row][captured_pawn_col]
-                                if captured_pawn:
-                                    all_sprites.remove(captured_pawn)  
-                                    board_state[captured_pawn_row][captured_pawn_col] = None
-                        
-                        # Normal capture (only if NOT en passant)
-                        if not is_en_passant_capture:
-                            captured = board_state[new_row][new_col]
-                            if captured is not None and captured.color != selected_piece.color:
-                                all_sprites.remove(captured)  
-                        
-                        board_state[new_row][new_col] = selected_piece
-                        selected_piece.row = new_row
-                        selected_piece.col = new_col
-                        
-                      
-                        # Reset
-                        en_passant_target = None
-                        
-                        # Check if a pawn just moved 2
-                        if selected_piece.type == "pawn":
-                            # White pawn moved from row 6 to row 4
-                            if selected_piece.color == "white" and old_row == 6 and new_row == 4:
-                                en_passant_target = (5, new_col)  # Target is the skipped square
-                                en_passant_turn = turn
-
-                            # Black pawn moved from row 1 to row 3
-                            elif selected_piece.color == "black" and old_row == 1 and new_row == 3:
-                                en_passant_target = (2, new_col)  
-                                en_passant_turn = turn
-                                
-                            #Check for pawn promotion
-                            if selected_piece.color == "white" and new_row == 0:
-                                promotion_menu_active = True
-                                promoting_color = "white"
-                                promoting_pos = (new_row, new_col)
-                                promotion_buttons_ready = False
-                            elif selected_piece.color == "black" and new_row == 7:
+                        all_sprites.move_to_front(sprite)
+                        targets = legal_moves.targets(board_state, square(row, col))
+                        show_target_markers(target_markers, [square_origin(*divmod(sq, 8), chessboard_rect, flip_view) for sq in targets])
+
+            elif event.type == pygame.MOUSEBUTTONUP:
+                if selected_piece and not promotion_menu_active:
+                    old_row, old_col = selected_piece.row, selected_piece.col
+                    new_row, new_col = get_board_coords(mouse_pos, chessboard_rect, square_width, square_height, flip_view)
+                    if 0 <= new_row < 8 and 0 <= new_col < 8:
+                        from_sq = square(old_row, old_col)
+                        to_sq = square(new_row, new_col)
+                        if to_sq in legal_moves.targets(board_state, from_sq):
+                            #Check for pawn promotion; the move is made once a piece is chosen
+                            if piece_type(selected_piece.code) == PAWN and new_row in (0, 7):
                                 promotion_menu_active = True
-                                promoting_color = "black"
-                                promoting_pos = (new_row, new_col)
+                                promoting_color = selected_piece.color
+                                promoting_move = (from_sq, to_sq)
                                 promotion_buttons_ready = False
-                                
-                        if not promotion_menu_active:
-                            turn += 1
-                            flip_view = (turn % 2 == 1)
-                            all_sprites = update_sprite_positions(board_state, flip_view)
-                            
-                          
+                                selected_piece.rect.topleft = square_topleft(new_row, new_col, chessboard_rect, flip_view)
+                                selected_piece.dirty = 1
+                            else:
+                                play_move(game, sprites, encode_move(from_sq, to_sq))
+                                flip_view = (board_state.turn % 2 == 1)
+                                update_sprite_positions(sprites, all_sprites, chessboard_rect, flip_view)
+
+                        else:
+                            selected_piece.rect.topleft = square_topleft(old_row, old_col, chessboard_rect, flip_view)
+                            selected_piece.dirty = 1
+                    else:
+                        update_sprite_positions(sprites, all_sprites, chessboard_rect, flip_view)
+                    show_target_markers(target_markers, [])
+                    selected_piece = None
+
+        events_done = time.perf_counter()
+        profiler.record("events", events_done - frame_start)
+
+        # The engine thinks in its own process; each frame the loop only points it at the
+        # current position (a move search on its turn, a ponder on the reply it expects or
+        # an open-ended search otherwise) and collects what it sent. Stopping and
+        # restarting never waits on the engine.
+        if engine is not None and not promotion_menu_active:
+            wanted = None
+            if legal_moves.moves(board_state):
+                if engine_color == board_state.side_to_move:
+                    wanted = (len(game), board_state.key, "move")
+                elif analysis:
+                    wanted = (len(game), board_state.key, "analyse")
+                elif engine_color is not None and PONDER:
+                    if (expected_reply is not None and expected_reply[:2] == (len(game), board_state.key)
+                            and expected_reply[2] in legal_moves.moves(board_state)):
+                        wanted = (len(game), board_state.key, "ponder")
                     else:
-                        draw_row = 7 - old_row if flip_view else old_row
-                        draw_col = 7 - old_col if flip_view else old_col
-                        x = chessboard_rect.left + draw_col * square_width + 25
-                        y = chessboard_rect.top + draw_row * square_height
-                        selected_piece.rect.topleft = (x, y)
-                selected_piece = None
-
-    # Update dragging
-    if selected_piece and not promotion_menu_active:
-        selected_piece.rect.center = mouse_pos
-
-    # Draw everything
-    screen.blit(background_img, (0, 0))
-    screen.blit(chessboard_img, chessboard_rect.topleft)
-    all_sprites.draw(screen)
-
-    if promotion_menu_active:
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-        overlay.fill((0, 0, 0))
-        overlay.set_alpha(128)
-        screen.blit(overlay, (0, 0))
-        if not promotion_buttons_ready:
-            promotion_buttons, promotion_menu_rect = show_pawn_promotion_menu(promoting_color)
-            promotion_buttons_ready = True
+                        # No prediction: an open-ended search still warms the engine's table
+                        wanted = (len(game), board_state.key, "analyse")
+            if wanted != engine_search:
+                ponder_hit = (wanted is not None and wanted[2] == "move" and engine_search is not None
+                              and engine_search[2] == "ponder" and len(game) == engine_search[0] + 1
+                              and board_state.history()[-1] == expected_reply[2])
+                if ponder_hit:
+                    # The player made the expected move: the ponder search goes on as the engine's move
+                    engine.ponderhit()
+                else:
+                    engine.stop()
+                    if wanted is not None:
+                        searching = wanted[2] == "analyse"
+                        engine.set_option("MultiPV", ANALYSIS_LINES if analysis and searching else 1)
+                        engine.set_option("UCI_AnalyseMode", "true" if searching else "false")
+                        if wanted[2] == "ponder":
+                            engine.go(board_state, ENGINE_MOVETIME, ponder=expected_reply[2])
+                        else:
+                            engine.go(board_state, None if searching else ENGINE_MOVETIME)
+                engine_search = wanted
+            engine_move = engine.poll()
+            if wanted is not None and wanted[2] == "move" and engine_move in legal_moves.moves(board_state):
+                play_move(game, sprites, engine_move)
+                expected_reply = (len(game), board_state.key, engine.ponder_move) if engine.ponder_move else None
+                flip_view = (board_state.turn % 2 == 1)
+                update_sprite_positions(sprites, all_sprites, chessboard_rect, flip_view)
+            if engine.lines:
+                profiler.gauge("engine nps", engine.lines[min(engine.lines)].nps)
+        render_start = time.perf_counter()
+        profiler.record("engine io", render_start - events_done)
+
+        # Update dragging
+        if selected_piece and not promotion_menu_active and selected_piece.rect.center != mouse_pos:
+            selected_piece.rect.center = mouse_pos
+            selected_piece.dirty = 1
+
+        # Draw only what changed: dirty sprites, the menu region, or everything after a full redraw
+        if needs_full_redraw:
+            screen.blit(background, (0, 0))
+            all_sprites.repaint_rect(screen_rect)
+        dirty_rects = all_sprites.draw(screen)
+
+        # The game status only changes when a move is made or taken back
+        if status_ply != (len(game), board_state.key):
+            status_ply = (len(game), board_state.key)
+            status = game_status(board_state)
+
+        # Redraw the result line when its text changes or something painted over it
+        text = None
+        if status == CHECKMATE:
+            text = "Checkmate, " + ("black" if board_state.side_to_move == 0 else "white") + " wins"
+        elif status != ONGOING:
+            text = f"Draw by {status}"
+        elif show_result:
+            text = format_result(tablebases.probe(board_state), board_state.turn) if tablebases else "No tablebases found"
+        if text != result_text or (text and (needs_full_redraw or result_rect.collidelist(dirty_rects) != -1)):
+            screen.blit(background, result_rect, result_rect)
+            if text:
+                label = render_text(text, 28)
+                screen.blit(label, label.get_rect(center=result_rect.center))
+            dirty_rects.append(result_rect)
+            result_text = text
+
+        # The analysis panel is repainted when the engine reports a new line
+        if analysis:
+            title = "Analysis" if engine.thinking or engine.lines else "Analysis: no moves"
+            state = (title, engine.lines_version, len(game), board_state.key)
+        elif engine_search is not None and engine_search[2] == "analyse":
+            title, state = "Engine pondering", "pondering"
         else:
-            draw_promotion_menu(promotion_buttons, promotion_menu_rect, promoting_color)
-    
-    pygame.display.flip()
-    
+            title, state = "Press A to analyse", "idle"
+        if state != panel_state or needs_full_redraw or analysis_rect.collidelist(dirty_rects) != -1:
+            draw_analysis_panel(screen, analysis_rect, background, title,
+                                analysis_rows(board_state, engine.lines) if analysis else [])
+            dirty_rects.append(analysis_rect)
+            panel_state = state
+
+        # The HUD is refreshed a few times a second rather than every frame
+        if show_hud and (render_start - hud_updated >= HUD_REFRESH_SECONDS or needs_full_redraw
+                         or hud_rect.collidelist(dirty_rects) != -1):
+            draw_hud(screen, hud_rect, background, hud_lines(profiler))
+            dirty_rects.append(hud_rect)
+            hud_updated = render_start
+            hud_shown = True
+        elif hud_shown and not show_hud:
+            screen.blit(background, hud_rect, hud_rect)
+            dirty_rects.append(hud_rect)
+            hud_shown = False
+
+        if promotion_menu_active:
+            if not promotion_buttons_ready:
+                # Dim the board once and save what lies under the menu for button repaints
+                screen.blit(overlay, (0, 0))
+                menu_backdrop.blit(screen, (0, 0), centered_menu_rect(screen_rect))
+                promotion_buttons, promotion_menu_rect = show_pawn_promotion_menu(promoting_color)
+                promotion_buttons_ready = True
+                needs_full_redraw = True
+            else:
+                # Only buttons whose hover/click state changed are repainted
+                draw_promotion_menu(promotion_buttons, promotion_menu_rect, menu_backdrop, dirty_rects)
+
+        # Idle frames push nothing to the display
+        if needs_full_redraw:
+            pygame.display.flip()
+            needs_full_redraw = False
+        elif dirty_rects:
+            pygame.display.update(dirty_rects)
+        profiler.record("render", time.perf_counter() - render_start)
+
+    if engine is not None:
+        engine.close()
+    pygame.quit()
+    profiler.disable()
+    if args.profile:
+        profiler.dump(args.profile)
+    if args.cprofile:
+        profiler.dump(args.cprofile)
+    return 0
+
 
-pygame.quit()
+if __name__ == "__main__":
+    sys.exit(main())
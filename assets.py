@@ -0,0 +1,84 @@
+"""
+Asset cache
+Piece images are decoded and scaled once per size, then shared by every sprite
+and menu that shows them. Optionally the board-size images are packed into a
+single atlas surface and handed out as subsurfaces of it.
+
+    python assets.py    # time a cold preload against cached lookups
+"""
+import time
+
+import pygame
+from constants import PIECE_IMG_PATH, PIECE_IMAGE_SCALE
+from position import WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, COLOR_NAMES, PIECE_NAMES, make_piece, piece_type, piece_color
+
+PIECE_CODES = tuple(make_piece(color, ptype) for color in (WHITE, BLACK)
+                    for ptype in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING))
+
+# (piece code, (width, height)) -> shared Surface
+_images = {}
+_stats = {"loads": 0, "hits": 0, "load_seconds": 0.0}
+
+
+def _load(code, size):
+    start = time.perf_counter()
+    path = PIECE_IMG_PATH.format(color=COLOR_NAMES[piece_color(code)], type=PIECE_NAMES[piece_type(code)])
+    image = pygame.transform.scale(pygame.image.load(path).convert_alpha(), size)
+    _stats["loads"] += 1
+    _stats["load_seconds"] += time.perf_counter() - start
+    return image
+
+
+def piece_image(code, size=PIECE_IMAGE_SCALE):
+    """Return the shared surface for a piece code at `size`; do not draw onto it."""
+    key = (code, tuple(size))
+    image = _images.get(key)
+    if image is None:
+        image = _images[key] = _load(code, key[1])
+    else:
+        _stats["hits"] += 1
+    return image
+
+
+def preload_piece_images(size=PIECE_IMAGE_SCALE, atlas=False):
+    """Decode all 12 piece images at `size` up front; returns the seconds it took.
+
+    With `atlas`, the images are packed into one 6x2 sprite sheet and the cache
+    serves subsurfaces of it.
+    """
+    start = time.perf_counter()
+    size = tuple(size)
+    images = [piece_image(code, size) for code in PIECE_CODES]
+    if atlas:
+        width, height = size
+        sheet = pygame.Surface((width * 6, height * 2), pygame.SRCALPHA).convert_alpha()
+        for index, (code, image) in enumerate(zip(PIECE_CODES, images)):
+            rect = pygame.Rect((index % 6) * width, (index // 6) * height, width, height)
+            sheet.blit(image, rect)
+            _images[(code, size)] = sheet.subsurface(rect)
+    return time.perf_counter() - start
+
+
+def clear_cache():
+    _images.clear()
+
+
+def cache_stats():
+    """Return image loads, cache hits and total seconds spent decoding and scaling."""
+    return dict(_stats, cached=len(_images))
+
+
+if __name__ == "__main__":
+    import os
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    cold = preload_piece_images(atlas=True)
+    start = time.perf_counter()
+    for _ in range(1000):
+        for code in PIECE_CODES:
+            piece_image(code)
+    warm = (time.perf_counter() - start) / (1000 * len(PIECE_CODES))
+    print(f"cold preload of {len(PIECE_CODES)} images: {cold * 1000:.2f} ms")
+    print(f"cached lookup: {warm * 1e6:.3f} us")
+    print(cache_stats())
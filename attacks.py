@@ -0,0 +1,113 @@
+"""
+Attack tables
+Per-square target lists computed once at import: knight and king jumps, pawn
+captures for each color, and the rays a rook or bishop slides along. The rules
+and the search look squares up here instead of walking offsets each call.
+"""
+from position import WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, make_piece
+
+KNIGHT_OFFSETS = ((2, 1), (1, 2), (-1, 2), (-2, 1), (-2, -1), (-1, -2), (1, -2), (2, -1))
+KING_OFFSETS = ((1, 1), (1, 0), (1, -1), (0, 1), (0, -1), (-1, 1), (-1, 0), (-1, -1))
+ROOK_DIRECTIONS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+BISHOP_DIRECTIONS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+
+
+def _jumps(sq, offsets):
+    row, col = divmod(sq, 8)
+    return tuple((row + dr) * 8 + col + dc for dr, dc in offsets
+                 if 0 <= row + dr < 8 and 0 <= col + dc < 8)
+
+
+def _rays(sq, directions):
+    row, col = divmod(sq, 8)
+    rays = []
+    for dr, dc in directions:
+        ray = []
+        r, c = row + dr, col + dc
+        while 0 <= r < 8 and 0 <= c < 8:
+            ray.append(r * 8 + c)
+            r += dr
+            c += dc
+        if ray:
+            rays.append(tuple(ray))
+    return tuple(rays)
+
+
+KNIGHT_ATTACKS = tuple(_jumps(sq, KNIGHT_OFFSETS) for sq in range(64))
+KING_ATTACKS = tuple(_jumps(sq, KING_OFFSETS) for sq in range(64))
+# PAWN_ATTACKS[color][sq]: squares a pawn of `color` standing on sq captures on
+PAWN_ATTACKS = (tuple(_jumps(sq, ((-1, -1), (-1, 1))) for sq in range(64)),
+                tuple(_jumps(sq, ((1, -1), (1, 1))) for sq in range(64)))
+ROOK_RAYS = tuple(_rays(sq, ROOK_DIRECTIONS) for sq in range(64))
+BISHOP_RAYS = tuple(_rays(sq, BISHOP_DIRECTIONS) for sq in range(64))
+QUEEN_RAYS = tuple(ROOK_RAYS[sq] + BISHOP_RAYS[sq] for sq in range(64))
+
+_PAWNS = (make_piece(WHITE, PAWN), make_piece(BLACK, PAWN))
+_KNIGHTS = (make_piece(WHITE, KNIGHT), make_piece(BLACK, KNIGHT))
+_BISHOPS = (make_piece(WHITE, BISHOP), make_piece(BLACK, BISHOP))
+_ROOKS = (make_piece(WHITE, ROOK), make_piece(BLACK, ROOK))
+_QUEENS = (make_piece(WHITE, QUEEN), make_piece(BLACK, QUEEN))
+_KINGS = (make_piece(WHITE, KING), make_piece(BLACK, KING))
+
+
+def is_square_attacked(position, sq, by_color):
+    """Return True if any piece of `by_color` attacks square `sq`."""
+    board = position.board
+    knight = _KNIGHTS[by_color]
+    for target in KNIGHT_ATTACKS[sq]:
+        if board[target] == knight:
+            return True
+    # A pawn of by_color attacks sq from the squares an enemy pawn on sq would capture on
+    pawn = _PAWNS[by_color]
+    for target in PAWN_ATTACKS[by_color ^ 1][sq]:
+        if board[target] == pawn:
+            return True
+    queen = _QUEENS[by_color]
+    rook = _ROOKS[by_color]
+    for ray in ROOK_RAYS[sq]:
+        for target in ray:
+            piece = board[target]
+            if piece:
+                if piece == rook or piece == queen:
+                    return True
+                break
+    bishop = _BISHOPS[by_color]
+    for ray in BISHOP_RAYS[sq]:
+        for target in ray:
+            piece = board[target]
+            if piece:
+                if piece == bishop or piece == queen:
+                    return True
+                break
+    king = _KINGS[by_color]
+    for target in KING_ATTACKS[sq]:
+        if board[target] == king:
+            return True
+    return False
+
+
+def attackers(board, sq, by_color):
+    """Squares of the pieces of `by_color` that attack `sq` on `board` (a Position.board or a copy)."""
+    found = []
+    knight = _KNIGHTS[by_color]
+    for target in KNIGHT_ATTACKS[sq]:
+        if board[target] == knight:
+            found.append(target)
+    pawn = _PAWNS[by_color]
+    for target in PAWN_ATTACKS[by_color ^ 1][sq]:
+        if board[target] == pawn:
+            found.append(target)
+    queen = _QUEENS[by_color]
+    for rays, slider in ((ROOK_RAYS, _ROOKS[by_color]), (BISHOP_RAYS, _BISHOPS[by_color])):
+        for ray in rays[sq]:
+            for target in ray:
+                piece = board[target]
+                if piece:
+                    if piece == slider or piece == queen:
+                        found.append(target)
+                    break
+    king = _KINGS[by_color]
+    for target in KING_ATTACKS[sq]:
+        if board[target] == king:
+            found.append(target)
+    return found
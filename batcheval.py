@@ -0,0 +1,214 @@
+"""
+Batch evaluation
+Scores many positions at once with NumPy. Positions are packed into an N x 64
+int8 array of piece codes (the same bytes as Position.board), and every term of
+evaluate.evaluate_terms is computed for the whole batch with array operations:
+material, piece-square tables, mobility and pawn structure.
+
+evaluate_terms stays the reference; --check compares the two on positions from
+random games and --bench compares their speed. NumPy is only needed here.
+
+    python batcheval.py --check 20000
+    python batcheval.py --bench 100000
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from attacks import KNIGHT_ATTACKS, ROOK_DIRECTIONS, BISHOP_DIRECTIONS
+from evaluate import (PIECE_VALUES, PIECE_SQUARE, MOBILITY_WEIGHTS, DOUBLED_PAWN_PENALTY,
+                      ISOLATED_PAWN_PENALTY, PASSED_PAWN_BONUS, evaluate_terms)
+from perft import random_positions
+from position import WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, make_piece
+
+TERMS = ("material", "pst", "mobility", "pawns")
+
+# Positions per slice of work inside evaluate_batch
+CHUNK_SIZE = 8192
+
+_SQUARES = np.arange(64)
+
+# Per piece code: signed material, and signed piece-square bonus without the material
+_MATERIAL = np.zeros(16, dtype=np.int32)
+_PST = np.zeros((16, 64), dtype=np.int32)
+for _color in (WHITE, BLACK):
+    for _ptype in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING):
+        _code = make_piece(_color, _ptype)
+        _value = PIECE_VALUES[_ptype] if _color == WHITE else -PIECE_VALUES[_ptype]
+        _MATERIAL[_code] = _value
+        _PST[_code] = np.array(PIECE_SQUARE[_code], dtype=np.int32) - _value
+
+# _KNIGHT_TARGETS[sq, target]: a knight on sq attacks target
+_KNIGHT_TARGETS = np.zeros((64, 64), dtype=np.float32)
+for _sq in range(64):
+    _KNIGHT_TARGETS[_sq, list(KNIGHT_ATTACKS[_sq])] = 1
+
+
+def _ray_steps(directions):
+    """For each direction, per step 1..7: (squares that have a square at that distance, those squares)."""
+    steps = []
+    for dr, dc in directions:
+        per_step = []
+        for distance in range(1, 8):
+            rows = _SQUARES // 8 + dr * distance
+            cols = _SQUARES % 8 + dc * distance
+            valid = (rows >= 0) & (rows < 8) & (cols >= 0) & (cols < 8)
+            per_step.append((np.flatnonzero(valid), (rows * 8 + cols)[valid]))
+        steps.append(per_step)
+    return steps
+
+
+_ROOK_STEPS = _ray_steps(ROOK_DIRECTIONS)
+_BISHOP_STEPS = _ray_steps(BISHOP_DIRECTIONS)
+
+# _PASSED_BLOCKERS[color][sq, target]: an enemy pawn on target stops a pawn of color on sq being passed
+_PASSED_BLOCKERS = np.zeros((2, 64, 64), dtype=np.float32)
+_PASSED_BONUS = np.zeros((2, 64), dtype=np.int32)
+for _sq in range(8, 56):
+    _row, _col = divmod(_sq, 8)
+    for _target in range(64):
+        if abs(_target % 8 - _col) <= 1:
+            _PASSED_BLOCKERS[WHITE, _sq, _target] = _target // 8 < _row
+            _PASSED_BLOCKERS[BLACK, _sq, _target] = _target // 8 > _row
+    _PASSED_BONUS[WHITE, _sq] = PASSED_PAWN_BONUS[7 - _row]
+    _PASSED_BONUS[BLACK, _sq] = PASSED_PAWN_BONUS[_row]
+
+del _color, _ptype, _code, _value, _sq, _row, _col, _target
+
+
+def pack_positions(positions):
+    """Pack positions into an (N, 64) int8 array of piece codes."""
+    return np.frombuffer(b"".join(bytes(position.board) for position in positions),
+                         dtype=np.int8).reshape(len(positions), 64).copy()
+
+
+def to_planes(boards):
+    """Expand (N, 64) piece codes into (N, 12, 64) uint8 planes: white P N B R Q K, then black."""
+    codes = np.array([make_piece(color, ptype) for color in (WHITE, BLACK)
+                      for ptype in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING)], dtype=np.int8)
+    return (boards[:, None, :] == codes[None, :, None]).astype(np.uint8)
+
+
+def _slider_counts(occupied, available, steps):
+    """Per color and square, how many `available` targets a slider there reaches along `steps`.
+
+    Arrays are square-major, (64, N), so every step gathers whole rows.
+    """
+    counts = (np.zeros(occupied.shape, dtype=np.uint8), np.zeros(occupied.shape, dtype=np.uint8))
+    for direction in steps:
+        open_ray = np.ones(occupied.shape, dtype=bool)
+        for sources, targets in direction:
+            ray = open_ray[sources]
+            counts[WHITE][sources] += ray & available[WHITE][targets]
+            counts[BLACK][sources] += ray & available[BLACK][targets]
+            open_ray[sources] = ray & ~occupied[targets]
+    return counts
+
+
+def mobility(boards):
+    """Vectorized evaluate.mobility: white minus black weighted pseudo-legal target counts."""
+    squares = np.ascontiguousarray(boards.T)
+    occupied = squares != 0
+    colors = squares >> 3
+    available = (~(occupied & (colors == WHITE)), ~(occupied & (colors == BLACK)))
+    rooks = _slider_counts(occupied, available, _ROOK_STEPS)
+    bishops = _slider_counts(occupied, available, _BISHOP_STEPS)
+    score = np.zeros(len(boards), dtype=np.int32)
+    for color, sign in ((WHITE, 1), (BLACK, -1)):
+        knights = _KNIGHT_TARGETS @ available[color].astype(np.float32)
+        queens = rooks[color].astype(np.int32) + bishops[color]
+        for ptype, counts in ((KNIGHT, knights), (BISHOP, bishops[color]), (ROOK, rooks[color]), (QUEEN, queens)):
+            mask = squares == make_piece(color, ptype)
+            score += sign * MOBILITY_WEIGHTS[ptype] * (counts * mask).sum(axis=0, dtype=np.int32)
+    return score
+
+
+def pawn_structure(boards):
+    """Vectorized evaluate.pawn_structure: doubled, isolated and passed pawns."""
+    pawns = (boards == make_piece(WHITE, PAWN), boards == make_piece(BLACK, PAWN))
+    score = np.zeros(len(boards), dtype=np.int32)
+    for color, sign in ((WHITE, 1), (BLACK, -1)):
+        own = pawns[color]
+        files = own.reshape(-1, 8, 8).sum(axis=1, dtype=np.int32)
+        doubled = np.maximum(files - 1, 0).sum(axis=1)
+        padded = np.pad(files, ((0, 0), (1, 1)))
+        lonely = (padded[:, :-2] == 0) & (padded[:, 2:] == 0)
+        isolated = (files * lonely).sum(axis=1)
+        blockers = pawns[color ^ 1].astype(np.float32) @ _PASSED_BLOCKERS[color].T
+        passed = own & (blockers == 0)
+        bonus = (passed * _PASSED_BONUS[color]).sum(axis=1, dtype=np.int32)
+        score += sign * (bonus - DOUBLED_PAWN_PENALTY * doubled - ISOLATED_PAWN_PENALTY * isolated)
+    return score
+
+
+def evaluate_batch(boards, terms=False, chunk_size=CHUNK_SIZE):
+    """Score an (N, 64) int8 batch, white-relative in centipawns.
+
+    Returns an int32 array of totals, or a dict of per-term arrays keyed like
+    evaluate.evaluate_terms when `terms` is true. The batch is worked through
+    `chunk_size` positions at a time so the intermediate arrays stay in cache.
+    """
+    boards = np.asarray(boards, dtype=np.int8)
+    result = {term: np.empty(len(boards), dtype=np.int32) for term in TERMS}
+    for start in range(0, len(boards), chunk_size):
+        chunk = boards[start:start + chunk_size]
+        end = start + len(chunk)
+        result["material"][start:end] = _MATERIAL[chunk].sum(axis=1, dtype=np.int32)
+        result["pst"][start:end] = _PST[chunk, _SQUARES].sum(axis=1, dtype=np.int32)
+        result["mobility"][start:end] = mobility(chunk)
+        result["pawns"][start:end] = pawn_structure(chunk)
+    if terms:
+        return result
+    return result["material"] + result["pst"] + result["mobility"] + result["pawns"]
+
+
+def check(positions):
+    """Compare evaluate_batch against evaluate_terms; returns the number of mismatching positions."""
+    batch = evaluate_batch(pack_positions(positions), terms=True)
+    mismatches = 0
+    for index, position in enumerate(positions):
+        reference = evaluate_terms(position)
+        wrong = [term for term in TERMS if reference[term] != batch[term][index]]
+        if wrong:
+            mismatches += 1
+            if mismatches <= 10:
+                print(f"{position.fen()}: " + ", ".join(
+                    f"{term} {reference[term]} != {int(batch[term][index])}" for term in wrong))
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="NumPy batch evaluator")
+    parser.add_argument("--check", type=int, metavar="N", help="cross-check N positions against evaluate_terms")
+    parser.add_argument("--bench", type=int, metavar="N", help="time N positions against the Python evaluator")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    status = 0
+    if args.check:
+        positions = random_positions(args.check, args.seed)
+        mismatches = check(positions)
+        print(f"{len(positions)} positions checked, {mismatches} mismatches")
+        status = 1 if mismatches else 0
+    if args.bench:
+        positions = random_positions(args.bench, args.seed)
+        start = time.perf_counter()
+        boards = pack_positions(positions)
+        packed = time.perf_counter()
+        evaluate_batch(boards)
+        batched = time.perf_counter()
+        for position in positions:
+            sum(evaluate_terms(position).values())
+        python = time.perf_counter()
+        print(f"{len(positions)} positions: pack {packed - start:.3f}s, batch {batched - packed:.3f}s "
+              f"({len(positions) / (batched - packed):,.0f}/s), python {python - batched:.3f}s "
+              f"({len(positions) / (python - batched):,.0f}/s), speedup {(python - batched) / (batched - packed):.1f}x")
+    if not args.check and not args.bench:
+        parser.print_help()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
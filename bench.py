@@ -0,0 +1,220 @@
+"""
+Benchmarks
+Regression benchmarks for the hot paths: move validation, check detection,
+move enumeration and headless rendering. Each benchmark runs over the same
+seeded corpus of positions from random games, and the best of several runs
+counts.
+
+Results are compared with a JSON baseline; a benchmark that got slower than
+the allowed slowdown fails the run. Baselines are machine specific, so save
+one on the machine that checks against it.
+
+    python bench.py --save                 # record bench_baseline.json
+    python bench.py                        # compare, fail on >25% slowdown
+    python bench.py --max-slowdown 0.1 --only perft render
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+
+from constants import SCREEN_WIDTH, SCREEN_HEIGHT, PIECE_ATLAS, PIECE_IMAGE_SCALE
+from perft import perft, random_positions, REFERENCE_POSITIONS
+from pieces import is_valid_move, is_legal_move, look_for_check
+from position import Position, WHITE, BLACK
+
+BASELINE_PATH = "bench_baseline.json"
+
+# Allowed slowdown against the baseline before a benchmark fails, as a fraction
+MAX_SLOWDOWN = 0.25
+
+# Frames of a dragged piece drawn after each position in the render benchmark
+DRAG_FRAMES = 10
+
+
+def _move_pairs(positions):
+    """(position, from, to) for every piece of the side to move and every target square."""
+    pairs = []
+    for position in positions:
+        side = position.side_to_move
+        for from_sq, code in enumerate(position.board):
+            if code and code >> 3 == side:
+                pairs.extend((position, from_sq, to_sq) for to_sq in range(64))
+    return pairs
+
+
+def bench_valid_move(positions):
+    pairs = _move_pairs(positions)
+
+    def run():
+        for position, from_sq, to_sq in pairs:
+            is_valid_move(position, from_sq, to_sq)
+        return len(pairs)
+    return run
+
+
+def bench_legal_move(positions):
+    pairs = _move_pairs(positions)
+
+    def run():
+        for position, from_sq, to_sq in pairs:
+            is_legal_move(position, from_sq, to_sq)
+        return len(pairs)
+    return run
+
+
+def bench_look_for_check(positions):
+    def run():
+        for _ in range(20):
+            for position in positions:
+                look_for_check(position, WHITE)
+                look_for_check(position, BLACK)
+        return 40 * len(positions)
+    return run
+
+
+def bench_perft(positions):
+    roots = [(Position.from_fen(REFERENCE_POSITIONS[name][0]), depth)
+             for name, depth in (("startpos", 3), ("kiwipete", 2), ("position3", 3))]
+
+    def run():
+        return sum(perft(position, depth) for position, depth in roots)
+    return run
+
+
+def bench_render(positions):
+    """Sprite placement and dirty-rect drawing on SDL's dummy video driver."""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    import pygame
+    from assets import preload_piece_images
+    from board import create_sprites, update_sprite_positions
+
+    pygame.display.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    preload_piece_images(PIECE_IMAGE_SCALE, atlas=PIECE_ATLAS)
+    background = pygame.Surface(screen.get_size())
+    background.fill((90, 60, 50))
+    chessboard_rect = pygame.Rect(0, 0, 700, 500)
+    chessboard_rect.center = screen.get_rect().center
+    screen.blit(background, (0, 0))
+
+    def run():
+        group = pygame.sprite.LayeredDirty()
+        group.clear(screen, background)
+        frames = 0
+        for index, position in enumerate(positions):
+            sprites = create_sprites(position)
+            update_sprite_positions(sprites, group, chessboard_rect, flip=index % 2 == 1)
+            group.draw(screen)
+            frames += 1
+            dragged = next(sprite for sprite in sprites if sprite)
+            for _ in range(DRAG_FRAMES):
+                dragged.rect.move_ip(3, 2)
+                dragged.dirty = 1
+                group.draw(screen)
+                frames += 1
+        return frames
+    return run
+
+
+BENCHMARKS = {
+    "is_valid_move": bench_valid_move,
+    "is_legal_move": bench_legal_move,
+    "look_for_check": bench_look_for_check,
+    "perft": bench_perft,
+    "render": bench_render,
+}
+
+
+def run_benchmark(name, positions, repeat):
+    """Best of `repeat` runs as {"seconds", "ops", "ops_per_sec"}; like timeit, the collector is off while timing."""
+    run = BENCHMARKS[name](positions)
+    best = None
+    ops = 0
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            ops = run()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        if collecting:
+            gc.enable()
+    return {"seconds": best, "ops": ops, "ops_per_sec": ops / best if best else 0.0}
+
+
+def load_baseline(path):
+    try:
+        with open(path) as data:
+            return json.load(data)
+    except FileNotFoundError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the regression benchmarks")
+    parser.add_argument("--only", nargs="+", metavar="NAME", help=f"benchmarks to run: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="JSON baseline to compare with or save")
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--max-slowdown", type=float, default=MAX_SLOWDOWN,
+                        help="fail when a benchmark is this much slower than the baseline (0.25 = 25%%)")
+    parser.add_argument("--positions", type=int, default=200, help="positions in the corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark; the fastest counts")
+    args = parser.parse_args(argv)
+
+    names = args.only or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark {', '.join(unknown)}")
+
+    positions = random_positions(args.positions, args.seed)
+    header = {"positions": args.positions, "seed": args.seed, "python": platform.python_version(),
+              "machine": platform.machine()}
+    baseline = None if args.save else load_baseline(args.baseline)
+    if baseline is not None:
+        # Timings from another corpus, interpreter or machine are not comparable
+        differ = [field for field, value in header.items() if baseline.get(field) != value]
+        if differ:
+            print(f"baseline {args.baseline} has a different {', '.join(differ)}; not comparing")
+            baseline = None
+
+    results = {}
+    failures = 0
+    for name in names:
+        result = results[name] = run_benchmark(name, positions, args.repeat)
+        line = f"{name:<15} {result['seconds'] * 1e3:9.1f} ms  {result['ops_per_sec']:13,.0f} ops/s"
+        reference = (baseline or {}).get("results", {}).get(name)
+        if reference is not None:
+            change = result["seconds"] / reference["seconds"] - 1
+            line += f"  {change:+7.1%} vs baseline"
+            if change > args.max_slowdown:
+                line += "  SLOWER"
+                failures += 1
+        print(line)
+
+    if args.save:
+        saved = load_baseline(args.baseline) or {}
+        # Results from another corpus or machine would be mixed in as if they matched; start over
+        if any(saved.get(field) != value for field, value in header.items()):
+            saved = {}
+        saved.update(header)
+        saved.setdefault("results", {}).update(results)
+        with open(args.baseline, "w") as out:
+            json.dump(saved, out, indent=2)
+        print(f"baseline written to {args.baseline}")
+    elif baseline is None:
+        print(f"no baseline to compare with; run with --save to write {args.baseline}")
+    if failures:
+        print(f"{failures} benchmark(s) slower than the baseline by more than {args.max_slowdown:.0%}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,161 @@
-from pieces import Piece
+import pygame
+from assets import piece_image
+from pieces import generate_legal_moves
+from position import (Position, KING, CASTLING_ROOKS, COLOR_NAMES, PIECE_NAMES, piece_type, piece_color,
+                      move_from, move_to)
+
+
+class Piece(pygame.sprite.DirtySprite):
+    """Sprite view of one piece on a Position; rules never look at it.
+
+    Set `dirty` after moving the rect so the renderer repaints it.
+    """
+
+    def __init__(self, code, row, col):
+        super().__init__()
+        self.code = code
+        self.type = PIECE_NAMES[piece_type(code)]
+        self.color = COLOR_NAMES[piece_color(code)]
+        self.row = row
+        self.col = col
+
+        # Shared, pre-scaled surface from the asset cache
+        self.image = piece_image(code)
+        self.rect = self.image.get_rect()
+
 
 def flip_board(board):
     return [row[::-1] for row in board[::-1]]
 
 def create_starting_board():
-    board_state = [
-        [Piece("rook", "black", 0, 0), Piece("knight", "black", 0, 1), Piece("bishop", "black", 0, 2), Piece("queen", "black", 0, 3),
-         Piece("king", "black", 0, 4), Piece("bishop", "black", 0, 5), Piece("knight", "black", 0, 6), Piece("rook", "black", 0, 7)],
-        [Piece("pawn", "black", 1, col) for col in range(8)],
-        [None] * 8,
-        [None] * 8,
-        [None] * 8,
-        [None] * 8,
-        [Piece("pawn", "white", 6, col) for col in range(8)],
-        [Piece("rook", "white", 7, 0), Piece("knight", "white", 7, 1), Piece("bishop", "white", 7, 2), Piece("queen", "white", 7, 3),
-         Piece("king", "white", 7, 4), Piece("bishop", "white", 7, 5), Piece("knight", "white", 7, 6), Piece("rook", "white", 7, 7)],
-    ]
-    return board_state
+    return Position.starting()
+
+def create_board_from_fen(fen):
+    """Build a board_state from a FEN string; raises ValueError if it is malformed."""
+    return Position.from_fen(fen)
+
+def create_sprites(position):
+    """Build the sprite view: one Piece sprite (or None) per square of the position."""
+    sprites = [None] * 64
+    for sq, code in enumerate(position.board):
+        if code:
+            sprites[sq] = Piece(code, sq // 8, sq % 8)
+    return sprites
+
+def sync_sprites(position, sprites):
+    """Bring the sprite view back in line with the position after a move."""
+    for sq, code in enumerate(position.board):
+        sprite = sprites[sq]
+        if not code:
+            sprites[sq] = None
+        elif sprite is None or sprite.code != code:
+            sprites[sq] = Piece(code, sq // 8, sq % 8)
+        else:
+            sprite.row, sprite.col = divmod(sq, 8)
+
+def square_origin(row, col, chessboard_rect, flip=False):
+    """Screen position of the top-left corner of square (row, col)."""
+    draw_row = 7 - row if flip else row
+    draw_col = 7 - col if flip else col
+    return (chessboard_rect.left + draw_col * (chessboard_rect.width // 8),
+            chessboard_rect.top + draw_row * (chessboard_rect.height // 8))
+
+def square_topleft(row, col, chessboard_rect, flip=False):
+    """Screen position of a piece standing on (row, col)."""
+    x, y = square_origin(row, col, chessboard_rect, flip)
+    return (x + 25, y)
+
+def update_sprite_positions(sprites, group, chessboard_rect, flip=False):
+    """Place each sprite on its square and make `group` hold exactly the live piece sprites.
+
+    Only sprites that actually moved are marked dirty.
+    """
+    live = set()
+    for piece in sprites:
+        if piece:
+            topleft = square_topleft(piece.row, piece.col, chessboard_rect, flip)
+            if piece.rect.topleft != topleft:
+                piece.rect.topleft = topleft
+                piece.dirty = 1
+            live.add(piece)
+            if not group.has(piece):
+                group.add(piece)
+    # Pieces live on layer 0; the target markers below them are left alone
+    for piece in group.get_sprites_from_layer(0):
+        if piece not in live:
+            group.remove(piece)
+    return group
+
+def _castling_rook(board_state, from_sq, to_sq):
+    if piece_type(board_state.board[from_sq]) == KING and abs(to_sq - from_sq) == 2:
+        return CASTLING_ROOKS[to_sq]
+    return None
+
+def play_move(game, sprites, move):
+    """Record the move in the game and carry the sprites along with it."""
+    board_state = game.position
+    from_sq, to_sq = move_from(move), move_to(move)
+    rook = _castling_rook(board_state, from_sq, to_sq)
+    game.push(move)
+    sprites[to_sq] = sprites[from_sq]
+    sprites[from_sq] = None
+    if rook:
+        sprites[rook[1]] = sprites[rook[0]]
+        sprites[rook[0]] = None
+    # Drops captured sprites and swaps in the promoted piece
+    sync_sprites(board_state, sprites)
+
+def take_back(game, sprites):
+    """Undo the last move, if any, and return True when something was undone."""
+    if not game.can_undo:
+        return False
+    board_state = game.position
+    move = game.undo()
+    from_sq, to_sq = move_from(move), move_to(move)
+    sprites[from_sq] = sprites[to_sq]
+    sprites[to_sq] = None
+    rook = _castling_rook(board_state, from_sq, to_sq)
+    if rook:
+        sprites[rook[0]] = sprites[rook[1]]
+        sprites[rook[1]] = None
+    # Restores captured pieces and demotes promoted ones
+    sync_sprites(board_state, sprites)
+    return True
+
+class LegalMoveCache:
+    """Legal moves of the side to move, grouped by from square.
+
+    Generated once per position: the cache is rebuilt the first time it is
+    asked about a position that differs from the last one, so making, undoing
+    or redoing a move invalidates it.
+    """
+
+    def __init__(self):
+        self._stamp = None
+        self._moves = frozenset()
+        self._targets = [frozenset()] * 64
+
+    def _refresh(self, position):
+        stamp = (len(position.stack), position.key)
+        if stamp == self._stamp:
+            return
+        moves = generate_legal_moves(position)
+        targets = [set() for _ in range(64)]
+        for move in moves:
+            targets[move & 63].add((move >> 6) & 63)
+        self._stamp = stamp
+        self._moves = frozenset(moves)
+        self._targets = [frozenset(squares) for squares in targets]
+
+    def moves(self, position):
+        """All legal moves in `position`, as a set."""
+        self._refresh(position)
+        return self._moves
+
+    def targets(self, position, from_sq):
+        """Squares the piece on `from_sq` may move to."""
+        self._refresh(position)
+        return self._targets[from_sq]
 
 def get_board_coords(mouse_pos, chessboard_rect, square_width, square_height, flip = False):
     mx, my = mouse_pos
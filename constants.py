@@ -13,3 +13,27 @@ CHESSBOARD_IMG_PATH = "assets/chessboard.png"
 
 # Piece sizing
 PIECE_IMAGE_SCALE = (40, 50)  # (width, height) in pixels
+PROMOTION_IMAGE_SCALE = (70, 70)  # piece images on the promotion menu buttons
+
+# Piece image path, filled in with color and piece names (e.g. "white", "queen")
+PIECE_IMG_PATH = "assets/{color}_{type}.png"
+
+# Pack the scaled piece images into one sprite sheet and hand out subsurfaces
+PIECE_ATLAS = True
+
+# Polyglot opening book consulted before the engine searches; the game runs without one if it is missing
+BOOK_PATH = "assets/book.bin"
+
+# Seconds the engine thinks per move when it plays a side (E in game)
+ENGINE_MOVETIME = 1.0
+
+# Analysis panel to the right of the board (A in game) and the number of lines it shows
+ANALYSIS_PANEL_WIDTH = 300
+ANALYSIS_LINES = 3
+
+# Let the engine keep searching on the player's time when it plays a side
+PONDER = True
+
+# Performance HUD (F3 in game) refresh period, and where F4 writes the collected timings
+HUD_REFRESH_SECONDS = 0.25
+PROFILE_PATH = "profile.json"
@@ -0,0 +1,505 @@
+"""
+Engine
+Negamax alpha-beta search with iterative deepening on top of the rules in
+pieces.py. Move ordering uses the transposition table / principal variation
+move first, then captures by MVV-LVA, killer moves and the history heuristic.
+The search stops hard at the per-move deadline and returns the result of the
+last completed iteration. While `pondering` is set the deadline waits: the
+search keeps deepening, and once the flag is cleared (a ponderhit) the time
+already spent counts against it. With an opening book attached, book positions are
+answered from the book without searching, and with tablebases attached the
+search scores covered endgames exactly instead of searching below them.
+At the horizon a quiescence search plays out captures and promotions until
+the position is quiet; captures that static exchange evaluation says lose
+material, or that cannot lift the score back to alpha (delta pruning), are
+skipped there, and the winning ones go first.
+With an NNUE network attached (nnue.py) leaves are scored by the network,
+its accumulator following the search move by move.
+With multipv above 1 every iteration also reports the best few root moves,
+each with its own line.
+
+    python engine.py --movetime 5
+    python engine.py --movetime 5 --multipv 3
+    python engine.py --fen "<fen>" --depth 6
+    python engine.py --book book.bin
+    python engine.py --fen "8/8/8/4k3/8/8/8/4K2R w - - 0 1" --tb tablebases
+    python engine.py --qsearch-report --depth 4
+    python engine.py --nnue nnue.bin
+"""
+import argparse
+import time
+from collections import namedtuple
+
+from book import OpeningBook
+from evaluate import evaluate
+from pieces import generate_legal_moves, generate_captures, look_for_check
+from position import Position, START_FEN, PAWN, QUEEN, make_move, unmake_move, move_uci
+from see import see, SEE_VALUES
+from tablebase import open_tablebases
+from tt import TranspositionTable, EXACT, LOWER, UPPER
+
+MATE = 100000
+INFINITY = 1000000
+MAX_PLY = 128
+
+# Scores beyond this are mates; they are stored relative to the node in the table
+MATE_BOUND = MATE - MAX_PLY
+
+MVV_LVA_VALUES = (0, 1, 3, 3, 5, 9, 10)
+
+# Positional swing a capture may still bring beyond the material it wins
+DELTA_MARGIN = 200
+
+# Depth of the quiescence pruning report when none is given
+QSEARCH_REPORT_DEPTH = 3
+
+_PV_SCORE = 1 << 30
+_CAPTURE_SCORE = 1 << 26
+_KILLER_SCORES = (1 << 25, (1 << 25) - 1)
+
+# multipv is the rank of the line among the root moves, 1 for the best
+SearchInfo = namedtuple("SearchInfo", "depth score nodes nps time pv multipv", defaults=(1,))
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def _relative_evaluate(position):
+    score = evaluate(position)
+    return score if position.turn & 1 == 0 else -score
+
+
+def format_info(info):
+    """Format a SearchInfo as a UCI-style info line."""
+    if abs(info.score) >= MATE_BOUND:
+        plies = MATE - abs(info.score)
+        moves = (plies + 1) // 2
+        score = f"mate {moves if info.score > 0 else -moves}"
+    else:
+        score = f"cp {info.score}"
+    pv = " ".join(move_uci(move) for move in info.pv)
+    return (f"info depth {info.depth} multipv {info.multipv} score {score} nodes {info.nodes} "
+            f"nps {info.nps} time {int(info.time * 1000)} pv {pv}")
+
+
+class Engine:
+    def __init__(self, tt_size_mb=16, book=None, tablebases=None, network=None):
+        self.tt = TranspositionTable(tt_size_mb)
+        self.book = book
+        self.tablebases = tablebases
+        # nnue.Network scoring the leaves instead of evaluate(); NumPy is only loaded when one is set
+        self.network = network
+        self._accumulator = None
+        # The search plays moves and scores leaves (side to move relative) through these two
+        self.make_move = make_move
+        self.evaluate = _relative_evaluate
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = [[0] * 64 for _ in range(64)]
+        self.nodes = 0
+        # Nodes of the quiescence search, a part of nodes
+        self.qnodes = 0
+        # SEE and delta pruning in the quiescence search; off only to measure what they save
+        self.qsearch_pruning = True
+        self.deadline = None
+        self.stopped = False
+        # Set while searching on the opponent's time; the deadline only applies once it is cleared
+        self.pondering = False
+
+    def new_game(self):
+        self.tt.clear()
+        self.history = [[0] * 64 for _ in range(64)]
+
+    def stop(self):
+        """Abort the running search. The flag stays set until the caller clears `stopped` for the next one."""
+        self.stopped = True
+
+    def _prepare_evaluation(self):
+        if self.network is None:
+            self.make_move = make_move
+            self.evaluate = _relative_evaluate
+            return
+        if self._accumulator is None or self._accumulator.network is not self.network:
+            from nnue import Accumulator
+            self._accumulator = Accumulator(self.network)
+        self.make_move = self._accumulator.make_move
+        self.evaluate = self._accumulator.evaluate
+
+    def search(self, position, max_depth=MAX_PLY - 1, movetime=None, on_iteration=None, multipv=1):
+        """Search `position` and return the SearchInfo of the last completed iteration.
+
+        `movetime` is a hard per-move limit in seconds, counted from the start
+        even when the search began as a ponder. `on_iteration` is called
+        with a SearchInfo after every completed depth, or after every line of it
+        when `multipv` asks for more than the best move. The position is left as
+        it was found, even when the deadline interrupts the search. A book move,
+        if there is one, comes back as a depth 0 result without searching.
+        """
+        start = time.perf_counter()
+        if self.book is not None:
+            move = self.book.choose_move(position)
+            if move is not None:
+                return SearchInfo(0, 0, 0, 0, time.perf_counter() - start, [move])
+        self.deadline = start + movetime if movetime is not None else None
+        self._prepare_evaluation()
+        self.nodes = 0
+        self.qnodes = 0
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.tt.new_search()
+        # Age the history so old cutoffs do not dominate the new search
+        for row in self.history:
+            for to_sq in range(64):
+                row[to_sq] >>= 3
+
+        root_ply = len(position.stack)
+        result = None
+        for depth in range(1, max_depth + 1):
+            try:
+                if multipv > 1:
+                    result = self._search_lines(position, depth, multipv, start, on_iteration)
+                    score = result.score
+                else:
+                    score = self._negamax(position, depth, -INFINITY, INFINITY, 0)
+            except SearchTimeout:
+                while len(position.stack) > root_ply:
+                    unmake_move(position)
+                break
+            elapsed = time.perf_counter() - start
+            if multipv <= 1:
+                result = SearchInfo(depth, score, self.nodes, int(self.nodes / elapsed) if elapsed > 0 else 0,
+                                    elapsed, self._principal_variation(position, depth))
+                if on_iteration is not None:
+                    on_iteration(result)
+            if abs(score) >= MATE_BOUND and MATE - abs(score) <= depth:
+                break
+            # The next iteration would not finish in the time that is left
+            if self.deadline is not None and not self.pondering and elapsed * 2 > movetime:
+                break
+
+        if result is None or not result.pv:
+            # Not even depth 1 finished: fall back to the first legal move
+            moves = generate_legal_moves(position)
+            elapsed = time.perf_counter() - start
+            result = SearchInfo(0, 0, self.nodes, 0, elapsed, moves[:1])
+        return result
+
+    def _search_lines(self, position, depth, count, start, on_iteration):
+        """One multi-PV iteration: the best `count` root moves, each searched with the better ones excluded.
+
+        Returns the SearchInfo of the best line. A timeout part way through
+        still leaves the lines already reported.
+        """
+        excluded = []
+        best = None
+        for rank in range(1, count + 1):
+            score, move = self._search_root(position, depth, excluded)
+            if not move:
+                break
+            make_move(position, move)
+            pv = [move] + self._principal_variation(position, depth - 1)
+            unmake_move(position)
+            elapsed = time.perf_counter() - start
+            info = SearchInfo(depth, score, self.nodes, int(self.nodes / elapsed) if elapsed > 0 else 0,
+                              elapsed, pv, rank)
+            if on_iteration is not None:
+                on_iteration(info)
+            if best is None:
+                best = info
+            excluded.append(move)
+        if best is None:
+            # No legal moves: report the mate or stalemate score
+            score = -MATE if look_for_check(position, position.turn & 1) else 0
+            best = SearchInfo(depth, score, self.nodes, 0, time.perf_counter() - start, [])
+        return best
+
+    def _search_root(self, position, depth, excluded):
+        """Best (score, move) among the root moves not in `excluded`; move is 0 when none are left."""
+        moves = [move for move in generate_legal_moves(position) if move not in excluded]
+        entry = self.tt.probe(position.key)
+        tt_move = entry[0] if entry is not None else 0
+        alpha = -INFINITY
+        best_move = 0
+        for move in self._order_moves(position, moves, tt_move, 0):
+            self.make_move(position, move)
+            score = -self._negamax(position, depth - 1, -INFINITY, -alpha, 1)
+            unmake_move(position)
+            if score > alpha:
+                alpha = score
+                best_move = move
+        # Only the unrestricted search may claim the root entry, so the best line keeps its move
+        if best_move and not excluded:
+            self.tt.store(position.key, best_move, depth, EXACT, alpha)
+        return alpha, best_move
+
+    def search_move(self, position, move, depth, alpha=-INFINITY, beta=INFINITY, movetime=None):
+        """Search a single root move to `depth` within the (alpha, beta) window.
+
+        Returns (score, pv) from the point of view of the side to move. Raises
+        SearchTimeout, with the position restored, if the deadline is hit.
+        """
+        self.deadline = time.perf_counter() + movetime if movetime is not None else None
+        self._prepare_evaluation()
+        root_ply = len(position.stack)
+        self.make_move(position, move)
+        try:
+            score = -self._negamax(position, depth - 1, -beta, -alpha, 1)
+        except SearchTimeout:
+            while len(position.stack) > root_ply:
+                unmake_move(position)
+            raise
+        pv = [move] + self._principal_variation(position, depth - 1)
+        unmake_move(position)
+        return score, pv
+
+    def _principal_variation(self, position, depth):
+        pv = []
+        for _ in range(depth):
+            entry = self.tt.probe(position.key)
+            if entry is None or entry[0] not in generate_legal_moves(position):
+                break
+            pv.append(entry[0])
+            make_move(position, entry[0])
+        for _ in pv:
+            unmake_move(position)
+        return pv
+
+    def _order_moves(self, position, moves, tt_move, ply):
+        board = position.board
+        killers = self.killers[ply]
+        history = self.history
+        scored = []
+        for move in moves:
+            from_sq = move & 63
+            to_sq = (move >> 6) & 63
+            if move == tt_move:
+                score = _PV_SCORE
+            elif board[to_sq] or move >> 12:
+                score = (_CAPTURE_SCORE + 16 * MVV_LVA_VALUES[board[to_sq] & 7]
+                         - MVV_LVA_VALUES[board[from_sq] & 7] + (move >> 12))
+            elif move == killers[0]:
+                score = _KILLER_SCORES[0]
+            elif move == killers[1]:
+                score = _KILLER_SCORES[1]
+            else:
+                score = history[from_sq][to_sq]
+            scored.append((score, move))
+        scored.sort(reverse=True)
+        return [move for _, move in scored]
+
+    def _negamax(self, position, depth, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & 1023 and (self.stopped or (self.deadline is not None and not self.pondering
+                                                        and time.perf_counter() >= self.deadline)):
+            raise SearchTimeout
+
+        if ply and (position.halfmove >= 100 or position.repetitions(2) >= 2):
+            return 0
+
+        # Three pieces or fewer: the tablebases know the exact result
+        if ply and self.tablebases is not None and position.board.count(0) >= 61:
+            score = self.tablebases.probe_score(position, ply, MATE)
+            if score is not None:
+                return score
+
+        tt_move = 0
+        entry = self.tt.probe(position.key)
+        if entry is not None:
+            tt_move, tt_depth, flag, tt_score = entry
+            if ply and tt_depth >= depth:
+                if tt_score >= MATE_BOUND:
+                    tt_score -= ply
+                elif tt_score <= -MATE_BOUND:
+                    tt_score += ply
+                if flag == EXACT:
+                    return tt_score
+                if flag == LOWER and tt_score >= beta:
+                    return tt_score
+                if flag == UPPER and tt_score <= alpha:
+                    return tt_score
+
+        if depth <= 0:
+            return self._quiesce(position, alpha, beta, ply)
+
+        moves = generate_legal_moves(position)
+        if not moves:
+            return -MATE + ply if look_for_check(position, position.turn & 1) else 0
+
+        alpha_orig = alpha
+        best_score = -INFINITY
+        best_move = 0
+        board = position.board
+        for move in self._order_moves(position, moves, tt_move, ply):
+            self.make_move(position, move)
+            score = -self._negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            unmake_move(position)
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        # Quiet moves that cause a cutoff feed the killer and history tables
+                        if not board[(move >> 6) & 63] and not move >> 12:
+                            killers = self.killers[ply]
+                            if killers[0] != move:
+                                killers[1] = killers[0]
+                                killers[0] = move
+                            self.history[move & 63][(move >> 6) & 63] += depth * depth
+                        break
+
+        if best_score <= alpha_orig:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        stored = best_score
+        if stored >= MATE_BOUND:
+            stored += ply
+        elif stored <= -MATE_BOUND:
+            stored -= ply
+        self.tt.store(position.key, best_move, depth, flag, stored)
+        return best_score
+
+    def _quiesce(self, position, alpha, beta, ply):
+        """Search captures and promotions only, standing pat on the static score; evasions when in check."""
+        self.nodes += 1
+        self.qnodes += 1
+        if not self.nodes & 1023 and (self.stopped or (self.deadline is not None and not self.pondering
+                                                        and time.perf_counter() >= self.deadline)):
+            raise SearchTimeout
+
+        color = position.turn & 1
+        if ply >= MAX_PLY - 1:
+            return self.evaluate(position)
+
+        if look_for_check(position, color):
+            # No standing pat in check: every evasion is searched
+            moves = generate_legal_moves(position)
+            if not moves:
+                return -MATE + ply
+            best_score = -INFINITY
+            for move in self._order_moves(position, moves, 0, ply):
+                self.make_move(position, move)
+                score = -self._quiesce(position, -beta, -alpha, ply + 1)
+                unmake_move(position)
+                if score > best_score:
+                    best_score = score
+                    if score > alpha:
+                        alpha = score
+                        if alpha >= beta:
+                            break
+            return best_score
+
+        best_score = self.evaluate(position)
+        if best_score >= beta:
+            return best_score
+        if best_score > alpha:
+            alpha = best_score
+
+        board = position.board
+        pruning = self.qsearch_pruning
+        scored = []
+        for move in generate_captures(position, legal=False):
+            promotion = move >> 12
+            if promotion and promotion != QUEEN:
+                continue
+            to_sq = (move >> 6) & 63
+            # An empty target without a promotion is an en passant capture
+            victim = board[to_sq] & 7 or (0 if promotion else PAWN)
+            order = 16 * MVV_LVA_VALUES[victim] - MVV_LVA_VALUES[board[move & 63] & 7] + promotion
+            if pruning:
+                if not promotion and best_score + SEE_VALUES[victim] + DELTA_MARGIN <= alpha:
+                    continue
+                gain = see(position, move)
+                if gain < 0:
+                    continue
+                scored.append((gain, order, move))
+            else:
+                scored.append((0, order, move))
+        scored.sort(reverse=True)
+
+        for _, _, move in scored:
+            self.make_move(position, move)
+            if look_for_check(position, color):
+                unmake_move(position)
+                continue
+            score = -self._quiesce(position, -beta, -alpha, ply + 1)
+            unmake_move(position)
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best_score
+
+
+def qsearch_report(fens, depth):
+    """Search each FEN to `depth` with and without quiescence pruning; print and return the node counts.
+
+    Returns a list of (fen, pruned SearchInfo, unpruned SearchInfo, pruned
+    quiescence nodes, unpruned quiescence nodes).
+    """
+    rows = []
+    totals = [0, 0, 0, 0]
+    for fen in fens:
+        row = [fen]
+        counts = []
+        for pruning in (True, False):
+            engine = Engine()
+            engine.qsearch_pruning = pruning
+            row.append(engine.search(Position.from_fen(fen), depth))
+            counts.append(engine.qnodes)
+        row.extend(counts)
+        rows.append(tuple(row))
+        pruned, unpruned = row[1], row[2]
+        totals[0] += pruned.nodes
+        totals[1] += unpruned.nodes
+        totals[2] += counts[0]
+        totals[3] += counts[1]
+        print(f"{fen}\n  pruned   nodes {pruned.nodes:9,} (q {counts[0]:9,})  {pruned.time:6.2f}s  "
+              f"score {pruned.score:6}  best {move_uci(pruned.pv[0]) if pruned.pv else '-'}\n"
+              f"  unpruned nodes {unpruned.nodes:9,} (q {counts[1]:9,})  {unpruned.time:6.2f}s  "
+              f"score {unpruned.score:6}  best {move_uci(unpruned.pv[0]) if unpruned.pv else '-'}")
+    if totals[1] and totals[3]:
+        print(f"depth {depth}: nodes {totals[0]:,} vs {totals[1]:,} ({1 - totals[0] / totals[1]:.1%} fewer), "
+              f"quiescence nodes {totals[2]:,} vs {totals[3]:,} ({1 - totals[2] / totals[3]:.1%} fewer)")
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search a position with the alpha-beta engine")
+    parser.add_argument("--fen", default=START_FEN)
+    parser.add_argument("--movetime", type=float, default=5.0, help="seconds per move (hard limit)")
+    parser.add_argument("--depth", type=int, default=MAX_PLY - 1)
+    parser.add_argument("--tt-mb", type=int, default=16)
+    parser.add_argument("--book", help="Polyglot opening book to consult before searching")
+    parser.add_argument("--tb", metavar="DIR", help="directory of endgame tablebases to probe")
+    parser.add_argument("--multipv", type=int, default=1, help="number of best lines to report")
+    parser.add_argument("--nnue", metavar="FILE", help="NNUE weights to evaluate with (see nnue.py)")
+    parser.add_argument("--qsearch-report", action="store_true",
+                        help="compare nodes with and without quiescence pruning on the perft positions "
+                             "(or --fen) at --depth")
+    args = parser.parse_args(argv)
+
+    if args.qsearch_report:
+        from perft import REFERENCE_POSITIONS
+        fens = [args.fen] if args.fen != START_FEN else [fen for fen, _ in REFERENCE_POSITIONS.values()]
+        qsearch_report(fens, args.depth if args.depth < MAX_PLY - 1 else QSEARCH_REPORT_DEPTH)
+        return
+
+    network = None
+    if args.nnue:
+        from nnue import load_network
+        network = load_network(args.nnue)
+    engine = Engine(args.tt_mb, OpeningBook(args.book) if args.book else None,
+                    open_tablebases(args.tb) if args.tb else None, network)
+    info = engine.search(Position.from_fen(args.fen), args.depth, args.movetime,
+                         on_iteration=lambda info: print(format_info(info), flush=True), multipv=args.multipv)
+    print("bestmove", move_uci(info.pv[0]) if info.pv else "0000")
+    print("tt", engine.tt.stats())
+
+
+if __name__ == "__main__":
+    main()
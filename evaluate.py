@@ -0,0 +1,188 @@
+"""
+Evaluation
+Static evaluation in centipawns from white's point of view: material plus
+piece-square tables. Tables are laid out like the board, row 0 first, so a
+white piece on square sq reads TABLE[sq] and a black piece reads TABLE[sq ^ 56].
+
+evaluate() is what the search calls. evaluate_terms() adds mobility and pawn
+structure and is the reference the NumPy batch evaluator is checked against.
+"""
+from attacks import KNIGHT_ATTACKS, ROOK_RAYS, BISHOP_RAYS, QUEEN_RAYS
+from position import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK, make_piece
+
+PIECE_VALUES = (0, 100, 320, 330, 500, 900, 0)
+
+PAWN_TABLE = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     10,  10,  20,  30,  30,  20,  10,  10,
+      5,   5,  10,  25,  25,  10,   5,   5,
+      0,   0,   0,  20,  20,   0,   0,   0,
+      5,  -5, -10,   0,   0, -10,  -5,   5,
+      5,  10,  10, -20, -20,  10,  10,   5,
+      0,   0,   0,   0,   0,   0,   0,   0,
+)
+
+KNIGHT_TABLE = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+)
+
+BISHOP_TABLE = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+)
+
+ROOK_TABLE = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+      5,  10,  10,  10,  10,  10,  10,   5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+      0,   0,   0,   5,   5,   0,   0,   0,
+)
+
+QUEEN_TABLE = (
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+     -5,   0,   5,   5,   5,   5,   0,  -5,
+      0,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+)
+
+KING_TABLE = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+     20,  20,   0,   0,   0,   0,  20,  20,
+     20,  30,  10,   0,   0,  10,  30,  20,
+)
+
+PIECE_TABLES = (None, PAWN_TABLE, KNIGHT_TABLE, BISHOP_TABLE, ROOK_TABLE, QUEEN_TABLE, KING_TABLE)
+
+# PIECE_SQUARE[piece code][sq]: material plus table bonus, negated for black
+PIECE_SQUARE = [[0] * 64 for _ in range(16)]
+for _ptype in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING):
+    for _sq in range(64):
+        PIECE_SQUARE[make_piece(WHITE, _ptype)][_sq] = PIECE_VALUES[_ptype] + PIECE_TABLES[_ptype][_sq]
+        PIECE_SQUARE[make_piece(BLACK, _ptype)][_sq] = -(PIECE_VALUES[_ptype] + PIECE_TABLES[_ptype][_sq ^ 56])
+del _ptype, _sq
+
+# Centipawns per square a piece attacks that is empty or holds an enemy piece
+MOBILITY_WEIGHTS = (0, 0, 4, 3, 2, 1, 0)
+
+DOUBLED_PAWN_PENALTY = 10
+ISOLATED_PAWN_PENALTY = 15
+# Bonus for a passed pawn by ranks advanced from its starting rank side (index 1 = second rank)
+PASSED_PAWN_BONUS = (0, 10, 15, 25, 40, 65, 100, 0)
+
+_PIECE_RAYS = {BISHOP: BISHOP_RAYS, ROOK: ROOK_RAYS, QUEEN: QUEEN_RAYS}
+
+
+def evaluate(position):
+    """Return the static score of `position` in centipawns, positive when white is better."""
+    score = 0
+    for sq, piece in enumerate(position.board):
+        if piece:
+            score += PIECE_SQUARE[piece][sq]
+    return score
+
+
+def mobility(position):
+    """Return white's mobility score minus black's, counting pseudo-legal targets per piece."""
+    board = position.board
+    score = 0
+    for sq, piece in enumerate(board):
+        ptype = piece & 7
+        weight = MOBILITY_WEIGHTS[ptype]
+        if not weight:
+            continue
+        color = piece >> 3
+        count = 0
+        if ptype == KNIGHT:
+            for target in KNIGHT_ATTACKS[sq]:
+                if not board[target] or board[target] >> 3 != color:
+                    count += 1
+        else:
+            for ray in _PIECE_RAYS[ptype][sq]:
+                for target in ray:
+                    if board[target]:
+                        if board[target] >> 3 != color:
+                            count += 1
+                        break
+                    count += 1
+        score += weight * count if color == WHITE else -weight * count
+    return score
+
+
+def pawn_structure(position):
+    """Return white's pawn structure score minus black's: doubled, isolated and passed pawns."""
+    board = position.board
+    pawns = ([], [])
+    files = ([0] * 8, [0] * 8)
+    for sq, piece in enumerate(board):
+        if piece & 7 == PAWN:
+            color = piece >> 3
+            pawns[color].append(sq)
+            files[color][sq & 7] += 1
+    score = 0
+    for color in (WHITE, BLACK):
+        own = files[color]
+        sign = 1 if color == WHITE else -1
+        for count in own:
+            if count > 1:
+                score -= sign * DOUBLED_PAWN_PENALTY * (count - 1)
+        for sq in pawns[color]:
+            row, col = sq >> 3, sq & 7
+            if (col == 0 or not own[col - 1]) and (col == 7 or not own[col + 1]):
+                score -= sign * ISOLATED_PAWN_PENALTY
+            # Passed: no enemy pawn ahead on this file or the two next to it
+            passed = True
+            for other in pawns[color ^ 1]:
+                if abs((other & 7) - col) <= 1 and ((other >> 3) < row if color == WHITE else (other >> 3) > row):
+                    passed = False
+                    break
+            if passed:
+                score += sign * PASSED_PAWN_BONUS[7 - row if color == WHITE else row]
+    return score
+
+
+def evaluate_terms(position):
+    """Return the full evaluation split into terms, each white-relative in centipawns."""
+    material = pst = 0
+    for sq, piece in enumerate(position.board):
+        if piece:
+            value = PIECE_VALUES[piece & 7]
+            material += value if piece >> 3 == WHITE else -value
+            pst += PIECE_SQUARE[piece][sq] - (value if piece >> 3 == WHITE else -value)
+    return {
+        "material": material,
+        "pst": pst,
+        "mobility": mobility(position),
+        "pawns": pawn_structure(position),
+    }
+
+
+def evaluate_full(position):
+    """Return the static score including mobility and pawn structure."""
+    return sum(evaluate_terms(position).values())
@@ -1,4 +1,52 @@
 import pygame
+from assets import piece_image
+from constants import PROMOTION_IMAGE_SCALE
+from position import WHITE, BLACK, PIECE_TYPES, make_piece
+
+
+MENU_SIZE = (400, 300)
+TITLE_TEXT = "Promote Pawn To:"
+
+# Legal target dots: a queen has at most 27 targets; the layer sits below the pieces
+MAX_TARGETS = 27
+TARGET_COLOR = (40, 160, 60, 150)
+TARGET_LAYER = -1
+
+# Analysis panel text
+PANEL_TITLE_SIZE = 30
+PANEL_TEXT_SIZE = 24
+PANEL_LINE_HEIGHT = 22
+PANEL_SCORE_COLOR = (255, 210, 90)
+
+# Performance HUD at the bottom of the panel
+HUD_HEIGHT = 100
+HUD_TEXT_SIZE = 22
+HUD_TEXT_COLOR = (150, 230, 150)
+
+# Fonts and rendered text are created once and reused by every menu
+_fonts = {}
+_text_cache = {}
+
+
+def get_font(size):
+    font = _fonts.get(size)
+    if font is None:
+        font = _fonts[size] = pygame.font.Font(None, size)
+    return font
+
+
+def render_text(text, size, color=(255, 255, 255)):
+    """Return a cached rendering of `text`; callers must not draw onto it."""
+    key = (text, size, color)
+    surface = _text_cache.get(key)
+    if surface is None:
+        surface = _text_cache[key] = get_font(size).render(text, True, color)
+    return surface
+
+
+def centered_menu_rect(screen_rect):
+    return pygame.Rect((0, 0), MENU_SIZE).move(screen_rect.centerx - MENU_SIZE[0] // 2,
+                                                screen_rect.centery - MENU_SIZE[1] // 2)
 
 
 class PromotionButton:
@@ -10,28 +58,43 @@ class PromotionButton:
         self.hovered = False
         self.clicked = False
         self.click_animation_time = 0
+        self.label = render_text(piece_name.title(), 16)
+        self.label_rect = self.label.get_rect(center=(self.rect.centerx, self.rect.bottom + 12))
+        # Everything the button paints, label included; repainted only when dirty
+        self.area = self.rect.union(self.label_rect)
+        self.drawn_state = None
+        self.dirty = True
+
+    def _state(self):
+        if self.clicked and self.click_animation_time > 0:
+            return "clicked"
+        return "hovered" if self.hovered else "normal"
 
     def update(self, mouse_pos, dt):
-        """Update hover state and click animation."""
+        """Update hover state and click animation; marks the button dirty when its look changes."""
         self.hovered = self.rect.collidepoint(mouse_pos)
         if self.click_animation_time > 0:
             self.click_animation_time -= dt
+        if self._state() != self.drawn_state:
+            self.dirty = True
 
     def handle_click(self, mouse_pos):
         """Check if button was clicked."""
         if self.rect.collidepoint(mouse_pos):
             self.clicked = True
             self.click_animation_time = 200  # 200ms animation
+            self.dirty = True
             return True
         return False
 
     def draw(self, surface):
         """Draw button with hover and click effects."""
+        state = self._state()
         # Base color changes on hover
-        if self.clicked and self.click_animation_time > 0:
+        if state == "clicked":
             base_color = (40, 40, 40)  # Darker when clicked
             border_color = (255, 255, 100)  # Yellow flash
-        elif self.hovered:
+        elif state == "hovered":
             base_color = (90, 90, 90)  # Lighter on hover
             border_color = (255, 255, 255)
         else:
@@ -43,97 +106,142 @@ class PromotionButton:
 
         # Draw image or fallback text
         if self.image:
-            img_rect = self.image.get_rect(center=self.rect.center)
-            surface.blit(self.image, img_rect)
+            surface.blit(self.image, self.image.get_rect(center=self.rect.center))
         else:
-            f = pygame.font.Font(None, 18)
-            t = f.render(self.piece_name.title(), True, (255, 255, 255))
-            surface.blit(t, t.get_rect(center=self.rect.center))
+            text = render_text(self.piece_name.title(), 18)
+            surface.blit(text, text.get_rect(center=self.rect.center))
+
+        # Piece name label below button
+        surface.blit(self.label, self.label_rect)
+        self.drawn_state = state
+        self.dirty = False
+
 
-        # Optional: draw piece name label below button
-        label_font = pygame.font.Font(None, 16)
-        label = label_font.render(self.piece_name.title(), True, (255, 255, 255))
-        label_rect = label.get_rect(center=(self.rect.centerx, self.rect.bottom + 12))
-        surface.blit(label, label_rect)
+class TargetMarker(pygame.sprite.DirtySprite):
+    """Dot drawn under a piece on each square the dragged piece may move to."""
+
+    def __init__(self, image):
+        super().__init__()
+        self.image = image
+        self.rect = image.get_rect()
+        self.visible = 0
+
+
+def make_target_markers(square_size, group, count=MAX_TARGETS):
+    """Create hidden markers once and add them to `group` below the pieces."""
+    image = pygame.Surface(square_size, pygame.SRCALPHA)
+    pygame.draw.circle(image, TARGET_COLOR, image.get_rect().center, min(square_size) // 6)
+    markers = [TargetMarker(image) for _ in range(count)]
+    for marker in markers:
+        group.add(marker, layer=TARGET_LAYER)
+    return markers
+
+
+def show_target_markers(markers, positions):
+    """Move markers to the `positions` (top-left corners) and hide the rest; only markers that change are repainted."""
+    for index, marker in enumerate(markers):
+        if index < len(positions):
+            if not marker.visible or marker.rect.topleft != positions[index]:
+                marker.rect.topleft = positions[index]
+                marker.visible = 1
+                marker.dirty = 1
+        elif marker.visible:
+            marker.visible = 0
+            marker.dirty = 1
+
+
+def wrap_text(text, size, width):
+    """Split `text` into lines no wider than `width` pixels at `size`."""
+    font = get_font(size)
+    lines = []
+    for word in text.split():
+        if lines and font.size(lines[-1] + " " + word)[0] <= width:
+            lines[-1] += " " + word
+        else:
+            lines.append(word)
+    return lines
+
+
+def draw_analysis_panel(screen, rect, backdrop, title, rows):
+    """Repaint the analysis panel: `title`, then a (score, moves) pair per line.
+
+    Analysis text changes every iteration, so it is rendered directly instead
+    of going through the render_text cache.
+    """
+    screen.blit(backdrop, rect, rect)
+    font = get_font(PANEL_TEXT_SIZE)
+    screen.blit(get_font(PANEL_TITLE_SIZE).render(title, True, (255, 255, 255)), (rect.x + 12, rect.y + 12))
+    y = rect.y + 50
+    for score, moves in rows:
+        screen.blit(font.render(score, True, PANEL_SCORE_COLOR), (rect.x + 12, y))
+        for line in wrap_text(moves, PANEL_TEXT_SIZE, rect.width - 80):
+            if y + PANEL_LINE_HEIGHT > rect.bottom:
+                return
+            screen.blit(font.render(line, True, (230, 230, 230)), (rect.x + 70, y))
+            y += PANEL_LINE_HEIGHT
+        y += PANEL_LINE_HEIGHT // 2
+
+
+def draw_hud(screen, rect, backdrop, lines):
+    """Repaint the performance HUD with one row of text per line."""
+    screen.blit(backdrop, rect, rect)
+    font = get_font(HUD_TEXT_SIZE)
+    y = rect.y + 6
+    for line in lines:
+        screen.blit(font.render(line, True, HUD_TEXT_COLOR), (rect.x + 12, y))
+        y += HUD_TEXT_SIZE - 4
 
 
 def show_pawn_promotion_menu(promoting_color):
     """Display promotion menu and return button objects."""
     if promoting_color is None:
         promoting_color = "white"
-    menu_width, menu_height = 400, 300
     screen = pygame.display.get_surface()
-    screen_rect = screen.get_rect()
-    menu_surface = pygame.Surface((menu_width, menu_height), pygame.SRCALPHA)
-    menu_rect = menu_surface.get_rect(center=screen_rect.center)
+    menu_rect = centered_menu_rect(screen.get_rect())
+    menu_width, menu_height = menu_rect.size
 
-    title_font = pygame.font.Font(None, 36)
-    title = title_font.render("Promote Pawn To:", True, (255, 255, 255))
-    menu_surface.blit(title, title.get_rect(center=(menu_width // 2, 50)))
+    title = render_text(TITLE_TEXT, 36)
+    screen.blit(title, title.get_rect(center=(menu_rect.x + menu_width // 2, menu_rect.y + 50)))
 
     button_w, button_h = 80, 80
     spacing = 20
     pieces = ["Queen", "Rook", "Bishop", "Knight"]
 
-    # Load images
+    # Shared images from the asset cache, decoded once per size
+    color = BLACK if promoting_color == "black" else WHITE
     piece_images = {}
     for name in pieces:
-        path = f"images/{promoting_color}_{name.lower()}.png"
         try:
-            img = pygame.image.load(path).convert_alpha()
-            piece_images[name] = pygame.transform.scale(img, (button_w - 10, button_h - 10))
+            piece_images[name] = piece_image(make_piece(color, PIECE_TYPES[name.lower()]), PROMOTION_IMAGE_SCALE)
         except Exception as e:
-            print("Image load failed:", path, e)
+            print("Image load failed:", name, e)
             piece_images[name] = None
 
     total_w = len(pieces) * button_w + (len(pieces) - 1) * spacing
     start_x = (menu_width - total_w) // 2
     start_y = (menu_height - button_h) // 2
 
-    # Create button objects
+    # Create button objects in screen coordinates
     buttons = []
     for i, name in enumerate(pieces):
         x = start_x + i * (button_w + spacing)
-        local_rect = pygame.Rect(x, start_y, button_w, button_h)
-        # Convert to screen-space rect
-        screen_rect_btn = pygame.Rect(
-            menu_rect.x + local_rect.x,
-            menu_rect.y + local_rect.y,
-            local_rect.width,
-            local_rect.height
-        )
+        screen_rect_btn = pygame.Rect(menu_rect.x + x, menu_rect.y + start_y, button_w, button_h)
         button = PromotionButton(name, screen_rect_btn, piece_images[name])
+        button.draw(screen)
         buttons.append(button)
 
-    screen.blit(menu_surface, menu_rect)
     return buttons, menu_rect  # Return both for redrawing
 
 
-def draw_promotion_menu(buttons, menu_rect, promoting_color):
-    """Redraw menu with updated button states."""
-    screen = pygame.display.get_surface()
-    menu_width, menu_height = menu_rect.width, menu_rect.height
-    menu_surface = pygame.Surface((menu_width, menu_height), pygame.SRCALPHA)
-
-    # Redraw title
-    title_font = pygame.font.Font(None, 36)
-    title = title_font.render("Promote Pawn To:", True, (255, 255, 255))
-    menu_surface.blit(title, title.get_rect(center=(menu_width // 2, 50)))
+def draw_promotion_menu(buttons, menu_rect, backdrop, dirty_rects):
+    """Redraw only the buttons whose look changed and append their areas to `dirty_rects`.
 
-    # Draw buttons on menu surface (convert screen coords back to local)
+    `backdrop` holds what was on screen under the menu before it opened; it is
+    restored under a button before the button repaints.
+    """
+    screen = pygame.display.get_surface()
     for btn in buttons:
-        local_rect = pygame.Rect(
-            btn.rect.x - menu_rect.x,
-            btn.rect.y - menu_rect.y,
-            btn.rect.width,
-            btn.rect.height
-        )
-        # Temporarily adjust button rect for drawing
-        original_rect = btn.rect
-        btn.rect = local_rect
-        btn.draw(menu_surface)
-        btn.rect = original_rect  # Restore screen coords
-
-
-
-    screen.blit(menu_surface, menu_rect.topleft)   
+        if btn.dirty:
+            screen.blit(backdrop, btn.area, btn.area.move(-menu_rect.x, -menu_rect.y))
+            btn.draw(screen)
+            dirty_rects.append(btn.area)
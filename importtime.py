@@ -0,0 +1,91 @@
+"""
+Import time
+Measures how long each headless module takes to import in a fresh interpreter
+and fails when one goes over its budget or drags in pygame. The rules, engine
+and I/O modules are what tools and worker processes load, so they have to
+start in milliseconds; pygame belongs to assets.py, board.py and gameui.py,
+which only ChessGame.main() imports.
+
+    python importtime.py
+    python importtime.py engine uci --repeat 10
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# Milliseconds allowed for a cold import of each module, bytecode already compiled
+IMPORT_BUDGET_MS = {
+    "position": 15,
+    "pieces": 20,
+    "evaluate": 20,
+    "see": 25,
+    "record": 15,
+    "notation": 20,
+    "engine": 40,
+    "book": 35,
+    "tablebase": 35,
+    "pgn": 35,
+    "perft": 35,
+    "uci": 60,
+    "selfplay": 100,
+    "parallel": 100,
+    "profiling": 20,
+    "ChessGame": 60,
+}
+
+# Modules that may import pygame; importing any of them is a budget failure
+GUI_MODULES = ("pygame", "assets", "board", "gameui")
+
+_PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed * 1000, ",".join(name for name in {gui!r} if name in sys.modules))
+"""
+
+
+def measure(module, repeat=5):
+    """Best of `repeat` cold imports of `module` in milliseconds, and the GUI modules it loaded."""
+    root = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    loaded = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", _PROBE.format(module=module, gui=GUI_MODULES)],
+                                cwd=root, capture_output=True, text=True, check=True).stdout
+        elapsed, _, names = output.strip().partition(" ")
+        best = float(elapsed) if best is None else min(best, float(elapsed))
+        loaded = names.split(",") if names else []
+    return best, loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check cold import times against their budgets")
+    parser.add_argument("modules", nargs="*", help=f"modules to check (default: all of {', '.join(IMPORT_BUDGET_MS)})")
+    parser.add_argument("--repeat", type=int, default=5, help="imports per module; the fastest counts")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every budget, for slow machines")
+    args = parser.parse_args(argv)
+
+    modules = args.modules or list(IMPORT_BUDGET_MS)
+    unknown = [module for module in modules if module not in IMPORT_BUDGET_MS]
+    if unknown:
+        parser.error(f"no budget for {', '.join(unknown)}")
+
+    failures = 0
+    for module in modules:
+        elapsed, loaded = measure(module, args.repeat)
+        budget = IMPORT_BUDGET_MS[module] * args.scale
+        problems = []
+        if elapsed > budget:
+            problems.append("over budget")
+        if loaded:
+            problems.append("imports " + ", ".join(loaded))
+        failures += bool(problems)
+        print(f"{module:<10} {elapsed:7.1f} ms  budget {budget:5.0f} ms  {'; '.join(problems) or 'ok'}")
+    print(f"{len(modules) - failures}/{len(modules)} modules within budget")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+"""
+NNUE evaluation
+A small efficiently updatable network: 768 inputs, one per piece kind and
+square, a first layer of `hidden` units per perspective, clipped ReLU, and one
+output. Every input is seen twice, by white as it is and by black with colors
+swapped and the board mirrored, so the side to move always reads its own half
+first.
+
+The first layer is a sum of weight columns, one per piece on the board, so a
+move only adds and removes the columns of the squares it changes: the moved
+piece, a capture, a promotion, the rook of a castling move, the pawn taken en
+passant. Accumulator keeps those sums for every ply of the line being
+searched; make_move() derives the child's sums from the parent's, and
+unmaking a move just goes back to the parent's entry. Entries are checked
+against the position's Zobrist key, and a missing or stale one is rebuilt from
+the whole board (a full refresh).
+
+Weights are integers, so incremental and refreshed sums agree exactly. The
+file format is a 20-byte header (magic, version, hidden units, clip, output
+scale and a reserved word) followed by little-endian int16 first-layer
+weights (768 x hidden), biases (hidden) and output weights (2 x hidden), and
+an int32 output bias.
+from_evaluation() builds the network that scores exactly like evaluate(), as a
+starting point and a reference. NumPy is only needed here.
+
+    python nnue.py write -o nnue.bin
+    python nnue.py check --positions 2000
+    python nnue.py bench --weights nnue.bin
+"""
+import argparse
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+from evaluate import PIECE_SQUARE, evaluate
+from perft import REFERENCE_POSITIONS, random_positions
+from pieces import generate_legal_moves
+from position import (Position, WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, CASTLING_ROOKS,
+                      make_piece, make_move, unmake_move)
+
+MAGIC = b"CGNN"
+VERSION = 1
+HEADER = struct.Struct("<4sHHiiI")
+
+INPUTS = 768
+DEFAULT_HIDDEN = 256
+
+# Clipped ReLU ceiling and output divisor of the random networks used for checks and benchmarks
+RANDOM_CLIP = 255
+RANDOM_SCALE = 64
+
+# Accumulator offset that keeps the evaluation network's sums above zero
+_EVALUATION_BIAS = 1000
+
+_PIECE_CODES = tuple(make_piece(color, ptype) for color in (WHITE, BLACK)
+                     for ptype in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING))
+
+
+def feature_index(piece, sq):
+    """Input of `piece` on `sq` as white sees it: piece kind (white P..K, then black) times 64 plus square."""
+    return ((piece >> 3) * 6 + (piece & 7) - 1) * 64 + sq
+
+
+class Network:
+    def __init__(self, ft_weights, ft_bias, out_weights, out_bias, clip, scale=1):
+        ft_weights = np.asarray(ft_weights, dtype=np.int16)
+        hidden = ft_weights.shape[1] if ft_weights.ndim == 2 else 0
+        if ft_weights.shape != (INPUTS, hidden) or not hidden:
+            raise ValueError(f"first layer must be {INPUTS} x hidden, got {ft_weights.shape}")
+        self.ft_weights = ft_weights
+        self.ft_bias = np.asarray(ft_bias, dtype=np.int16).reshape(hidden)
+        self.out_weights = np.asarray(out_weights, dtype=np.int16).reshape(2 * hidden)
+        self.out_bias = int(out_bias)
+        self.hidden = hidden
+        self.clip = int(clip)
+        self.scale = int(scale)
+        if self.clip <= 0 or self.scale <= 0:
+            raise ValueError("clip and scale must be positive")
+
+        # columns[piece << 6 | sq] holds the white and black perspective columns of that piece on sq
+        self.columns = np.zeros((16 * 64, 2, hidden), dtype=np.int32)
+        for piece in _PIECE_CODES:
+            for sq in range(64):
+                self.columns[piece << 6 | sq, WHITE] = ft_weights[feature_index(piece, sq)]
+                self.columns[piece << 6 | sq, BLACK] = ft_weights[feature_index(piece ^ 8, sq ^ 56)]
+        self.bias = np.stack([self.ft_bias, self.ft_bias]).astype(np.int32)
+        # Output weights laid out like the sums, per side to move: its own perspective uses the first half
+        own, other = self.out_weights[:hidden], self.out_weights[hidden:]
+        self.out_by_color = np.array([[own, other], [other, own]], dtype=np.int64)
+        # Scratch for the clipped activations; ufuncs into it are several times faster than np.clip
+        self._activations = np.empty((2, hidden), dtype=np.int64)
+
+    @classmethod
+    def random(cls, hidden=DEFAULT_HIDDEN, seed=0):
+        """A network with random weights, for agreement checks and benchmarks."""
+        rng = np.random.default_rng(seed)
+        return cls(rng.integers(-64, 65, (INPUTS, hidden)), rng.integers(0, 129, hidden),
+                   rng.integers(-64, 65, 2 * hidden), 0, RANDOM_CLIP, RANDOM_SCALE)
+
+    @classmethod
+    def from_evaluation(cls, hidden=DEFAULT_HIDDEN):
+        """The network that scores like evaluate(), relative to the side to move.
+
+        Unit 0 sums the piece-square values of the perspective's own pieces and
+        unit 1 those of the other side's; the output is their difference. The
+        other units are left at zero for training to fill.
+        """
+        if hidden < 2:
+            raise ValueError("the evaluation network needs at least 2 hidden units")
+        ft_weights = np.zeros((INPUTS, hidden), dtype=np.int16)
+        for piece in _PIECE_CODES:
+            # PIECE_SQUARE is white-relative; each side's unit counts its own pieces positively
+            unit = piece >> 3
+            sign = -1 if unit == BLACK else 1
+            for sq in range(64):
+                ft_weights[feature_index(piece, sq), unit] = sign * PIECE_SQUARE[piece][sq]
+        ft_bias = np.zeros(hidden, dtype=np.int16)
+        ft_bias[:2] = _EVALUATION_BIAS
+        out_weights = np.zeros(2 * hidden, dtype=np.int16)
+        out_weights[:2] = (1, -1)
+        return cls(ft_weights, ft_bias, out_weights, 0, np.iinfo(np.int16).max)
+
+    def output(self, sums, color):
+        """Score in centipawns for `color` to move from the first-layer sums of both perspectives."""
+        activations = self._activations
+        np.maximum(sums, 0, out=activations)
+        np.minimum(activations, self.clip, out=activations)
+        return (int(np.vdot(activations, self.out_by_color[color])) + self.out_bias) // self.scale
+
+    def refresh(self, board, out=None):
+        """First-layer sums of both perspectives for `board`, computed from every piece."""
+        indices = [piece << 6 | sq for sq, piece in enumerate(board) if piece]
+        return np.add(self.bias, self.columns[indices].sum(axis=0, dtype=np.int32), out=out)
+
+    def evaluate(self, position):
+        """Full evaluation without an accumulator, relative to the side to move."""
+        return self.output(self.refresh(position.board), position.turn & 1)
+
+    def save(self, path):
+        with open(path, "wb") as out:
+            out.write(HEADER.pack(MAGIC, VERSION, self.hidden, self.clip, self.scale, 0))
+            out.write(self.ft_weights.astype("<i2").tobytes())
+            out.write(self.ft_bias.astype("<i2").tobytes())
+            out.write(self.out_weights.astype("<i2").tobytes())
+            out.write(struct.pack("<i", self.out_bias))
+
+
+def load_network(path):
+    """Read a Network from a weights file; raises ValueError when the file is not one."""
+    with open(path, "rb") as data:
+        raw = data.read()
+    if len(raw) < HEADER.size:
+        raise ValueError(f"{path}: too short for a weights file")
+    magic, version, hidden, clip, scale, _ = HEADER.unpack_from(raw)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path}: not a version {VERSION} weights file")
+    sizes = (INPUTS * hidden, hidden, 2 * hidden)
+    expected = HEADER.size + 2 * sum(sizes) + 4
+    if len(raw) != expected:
+        raise ValueError(f"{path}: {len(raw)} bytes, expected {expected} for {hidden} hidden units")
+    arrays = []
+    offset = HEADER.size
+    for count in sizes:
+        arrays.append(np.frombuffer(raw, dtype="<i2", count=count, offset=offset))
+        offset += 2 * count
+    (out_bias,) = struct.unpack_from("<i", raw, offset)
+    return Network(arrays[0].reshape(INPUTS, hidden), arrays[1], arrays[2], out_bias, clip, scale)
+
+
+def open_network(path):
+    """Load the weights at `path`, or return None if there is no usable weights file there."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        return load_network(path)
+    except (OSError, ValueError):
+        return None
+
+
+class Accumulator:
+    """First-layer sums of `network` along a line of play, one entry per ply of the position."""
+
+    def __init__(self, network, capacity=256):
+        self.network = network
+        self.sums = np.zeros((capacity, 2, network.hidden), dtype=np.int32)
+        # Zobrist key of the position each entry belongs to, None while unset
+        self.keys = [None] * capacity
+        self.refreshes = 0
+
+    def _grow(self, ply):
+        capacity = len(self.keys)
+        while capacity <= ply:
+            capacity *= 2
+        sums = np.zeros((capacity, 2, self.network.hidden), dtype=np.int32)
+        sums[:len(self.keys)] = self.sums
+        self.sums = sums
+        self.keys.extend([None] * (capacity - len(self.keys)))
+
+    def current(self, position):
+        """The sums of `position`, refreshed from the board if its entry is missing or stale."""
+        ply = len(position.stack)
+        if ply >= len(self.keys):
+            self._grow(ply)
+        if self.keys[ply] != position.key:
+            self.network.refresh(position.board, out=self.sums[ply])
+            self.keys[ply] = position.key
+            self.refreshes += 1
+        return self.sums[ply]
+
+    def make_move(self, position, move):
+        """Play `move` on `position` and derive the new sums from the columns it changes."""
+        parent = self.current(position)
+        ply = len(position.stack) + 1
+        if ply >= len(self.keys):
+            self._grow(ply)
+            parent = self.sums[ply - 1]
+        columns = self.network.columns
+        child = self.sums[ply]
+        board = position.board
+        from_sq = move & 63
+        to_sq = (move >> 6) & 63
+        promotion = move >> 12
+        piece = board[from_sq]
+        captured = board[to_sq]
+
+        np.subtract(parent, columns[piece << 6 | from_sq], out=child)
+        child += columns[((piece & 8) | promotion if promotion else piece) << 6 | to_sq]
+        if captured:
+            child -= columns[captured << 6 | to_sq]
+        ptype = piece & 7
+        if ptype == PAWN and to_sq == position.ep_square:
+            captured_sq = to_sq + 8 if piece < 8 else to_sq - 8
+            child -= columns[(piece ^ 8) << 6 | captured_sq]
+        elif ptype == KING and to_sq - from_sq in (2, -2):
+            rook_from, rook_to = CASTLING_ROOKS[to_sq]
+            rook = board[rook_from]
+            child -= columns[rook << 6 | rook_from]
+            child += columns[rook << 6 | rook_to]
+
+        make_move(position, move)
+        self.keys[ply] = position.key
+
+    def unmake_move(self, position):
+        """Take back the last move; the parent's entry is still in place."""
+        return unmake_move(position)
+
+    def evaluate(self, position):
+        """Score of `position` in centipawns relative to the side to move."""
+        return self.network.output(self.current(position), position.turn & 1)
+
+
+def check(network, positions, depth=2):
+    """Compare incremental sums with full refreshes; returns the number of disagreements.
+
+    Walks every line to `depth` plies from the perft reference positions, which
+    cover castling, en passant and promotions, and every move from each of
+    `positions`, unmaking as it goes.
+    """
+    accumulator = Accumulator(network)
+    mismatches = 0
+
+    def compare(position):
+        nonlocal mismatches
+        incremental = accumulator.current(position)
+        if not np.array_equal(incremental, network.refresh(position.board)):
+            mismatches += 1
+            if mismatches <= 10:
+                print(f"{position.fen()}: incremental sums differ from a refresh")
+
+    def walk(position, depth):
+        compare(position)
+        if depth:
+            for move in generate_legal_moves(position):
+                accumulator.make_move(position, move)
+                walk(position, depth - 1)
+                accumulator.unmake_move(position)
+                compare(position)
+
+    for fen, _ in REFERENCE_POSITIONS.values():
+        walk(Position.from_fen(fen), depth)
+    for position in positions:
+        walk(position, 1)
+    return mismatches
+
+
+def bench(network, positions):
+    """Evaluations per second for one move and eval from each position: incremental, refreshed, evaluate()."""
+    lines = [(position, move) for position in positions for move in generate_legal_moves(position)[:4]]
+    accumulator = Accumulator(network)
+    for position in positions:
+        accumulator.current(position)
+    results = {}
+    start = time.perf_counter()
+    for position, move in lines:
+        accumulator.make_move(position, move)
+        accumulator.evaluate(position)
+        accumulator.unmake_move(position)
+    results["incremental"] = time.perf_counter() - start
+    start = time.perf_counter()
+    for position, move in lines:
+        make_move(position, move)
+        network.evaluate(position)
+        unmake_move(position)
+    results["refresh"] = time.perf_counter() - start
+    start = time.perf_counter()
+    for position, move in lines:
+        make_move(position, move)
+        evaluate(position)
+        unmake_move(position)
+    results["evaluate"] = time.perf_counter() - start
+    return len(lines), results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="NNUE evaluation with an incrementally updated accumulator")
+    commands = parser.add_subparsers(dest="command", required=True)
+    write = commands.add_parser("write", help="write the network that scores like evaluate()")
+    write.add_argument("-o", "--output", default="nnue.bin")
+    write.add_argument("--hidden", type=int, default=DEFAULT_HIDDEN)
+    for name, text in (("check", "check incremental updates against full refreshes"),
+                       ("bench", "measure evaluations per second")):
+        command = commands.add_parser(name, help=text)
+        command.add_argument("--weights", help="weights file (default: a random network)")
+        command.add_argument("--hidden", type=int, default=DEFAULT_HIDDEN, help="hidden units of the random network")
+        command.add_argument("--positions", type=int, default=1000)
+        command.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == "write":
+        network = Network.from_evaluation(args.hidden)
+        network.save(args.output)
+        print(f"{args.hidden} hidden units -> {os.path.getsize(args.output)} bytes in {args.output}")
+        return 0
+
+    try:
+        network = load_network(args.weights) if args.weights else Network.random(args.hidden, args.seed)
+    except (OSError, ValueError) as error:
+        print(error)
+        return 1
+    positions = random_positions(args.positions, args.seed)
+    if args.command == "check":
+        mismatches = check(network, positions)
+        print(f"{len(positions)} positions and the perft positions to depth 2 checked, {mismatches} mismatches")
+        return 1 if mismatches else 0
+
+    count, results = bench(network, positions)
+    print(f"{network.hidden} hidden units, {count} evaluations after a move")
+    for name, seconds in results.items():
+        print(f"{name:<12} {seconds:7.3f}s  {count / seconds:11,.0f} evals/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Notation
+Standard Algebraic Notation (SAN) for moves and PGN text for finished games.
+"""
+from pieces import generate_legal_moves, look_for_check
+from position import PAWN, KING, piece_type, square_name, make_move, unmake_move
+
+PIECE_LETTERS = " PNBRQK"
+
+
+def move_to_san(position, move, legal_moves=None):
+    """Return the SAN of a legal `move` in `position`, including check and mate marks."""
+    board = position.board
+    from_sq = move & 63
+    to_sq = (move >> 6) & 63
+    promotion = move >> 12
+    ptype = piece_type(board[from_sq])
+
+    if ptype == KING and to_sq - from_sq in (2, -2):
+        san = "O-O" if to_sq > from_sq else "O-O-O"
+    elif ptype == PAWN:
+        san = ""
+        if (from_sq & 7) != (to_sq & 7):
+            san = "abcdefgh"[from_sq & 7] + "x"
+        san += square_name(to_sq)
+        if promotion:
+            san += "=" + PIECE_LETTERS[promotion]
+    else:
+        if legal_moves is None:
+            legal_moves = generate_legal_moves(position)
+        # Other pieces of the same type that could also reach the target square
+        rivals = [other & 63 for other in legal_moves
+                  if other != move and (other >> 6) & 63 == to_sq and board[other & 63] == board[from_sq]]
+        san = PIECE_LETTERS[ptype]
+        if rivals:
+            if all((sq & 7) != (from_sq & 7) for sq in rivals):
+                san += "abcdefgh"[from_sq & 7]
+            elif all((sq >> 3) != (from_sq >> 3) for sq in rivals):
+                san += square_name(from_sq)[1]
+            else:
+                san += square_name(from_sq)
+        if board[to_sq]:
+            san += "x"
+        san += square_name(to_sq)
+
+    make_move(position, move)
+    if look_for_check(position, position.turn & 1):
+        san += "#" if not generate_legal_moves(position) else "+"
+    unmake_move(position)
+    return san
+
+
+def format_pgn(san_moves, result="*", headers=None, first_turn=0):
+    """Return a PGN game: header tags, then movetext wrapped at 80 columns.
+
+    `first_turn` is the ply counter of the starting position, so games from a
+    FEN with black to move number their moves correctly.
+    """
+    lines = [f'[{name} "{value}"]' for name, value in (headers or {}).items()]
+    if lines:
+        lines.append("")
+    tokens = []
+    for index, san in enumerate(san_moves):
+        turn = first_turn + index
+        if turn % 2 == 0:
+            tokens.append(f"{turn // 2 + 1}.")
+        elif index == 0:
+            tokens.append(f"{turn // 2 + 1}...")
+        tokens.append(san)
+    tokens.append(result)
+
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > 80:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,226 @@
+"""
+Parallel search
+Root-move splitting across a pool of worker processes, which sidesteps the GIL.
+Each iteration searches the expected best move first with a full window, then
+hands the remaining root moves to the workers with a null window around that
+score; only moves that fail high are re-searched. Every worker keeps its own
+Engine, so its transposition table and history stay warm between iterations.
+
+Results come back out of order while alpha keeps rising, so each one is judged
+against the alpha its window was submitted with: a null-window result above
+that alpha is a lower bound and always gets a full re-search from the current
+alpha, even when it no longer beats it. --check compares the pool's best move
+and score with a single Engine at a fixed depth.
+
+    python parallel.py --workers 4 --movetime 5
+    python parallel.py --bench --depth 4 --workers 4
+    python parallel.py --check --depth 3 --workers 4
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from book import OpeningBook
+from engine import Engine, SearchInfo, SearchTimeout, INFINITY, MATE_BOUND, MATE, format_info
+from perft import REFERENCE_POSITIONS
+from pieces import generate_legal_moves
+from position import Position, START_FEN, move_uci
+
+_worker_engine = None
+
+
+def _init_worker(tt_size_mb):
+    global _worker_engine
+    _worker_engine = Engine(tt_size_mb)
+
+
+def _search_root_move(position, move, depth, alpha, beta, movetime):
+    engine = _worker_engine
+    engine.nodes = 0
+    try:
+        score, pv = engine.search_move(position, move, depth, alpha, beta, movetime)
+    except SearchTimeout:
+        return move, None, engine.nodes, []
+    return move, score, engine.nodes, pv
+
+
+class ParallelSearch:
+    def __init__(self, workers=None, tt_size_mb=16, book=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.book = book
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(tt_size_mb,))
+        self.nodes = 0
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def search(self, position, max_depth=64, movetime=None, on_iteration=None):
+        """Iteratively deepen over the pool; returns the SearchInfo of the last completed depth."""
+        start = time.perf_counter()
+        if self.book is not None:
+            move = self.book.choose_move(position)
+            if move is not None:
+                return SearchInfo(0, 0, 0, 0, time.perf_counter() - start, [move])
+        deadline = start + movetime if movetime is not None else None
+        self.nodes = 0
+        moves = generate_legal_moves(position)
+        result = SearchInfo(0, 0, 0, 0, 0.0, moves[:1])
+        if len(moves) <= 1:
+            return result
+
+        for depth in range(1, max_depth + 1):
+            completed = self._search_depth(position, moves, depth, deadline)
+            if completed is None:
+                break
+            score, pv, moves = completed
+            elapsed = time.perf_counter() - start
+            result = SearchInfo(depth, score, self.nodes, int(self.nodes / elapsed) if elapsed > 0 else 0,
+                                elapsed, pv)
+            if on_iteration is not None:
+                on_iteration(result)
+            if abs(score) >= MATE_BOUND and MATE - abs(score) <= depth:
+                break
+            if deadline is not None and elapsed * 2 > movetime:
+                break
+        return result
+
+    def _remaining(self, deadline):
+        return None if deadline is None else max(deadline - time.perf_counter(), 0.0)
+
+    def _search_depth(self, position, moves, depth, deadline):
+        """Search every root move to `depth`; returns (score, pv, reordered moves) or None on timeout."""
+        submit = self.pool.submit
+        _, best_score, nodes, best_pv = submit(_search_root_move, position, moves[0], depth,
+                                               -INFINITY, INFINITY, self._remaining(deadline)).result()
+        self.nodes += nodes
+        if best_score is None:
+            return None
+        alpha = best_score
+        scores = {moves[0]: best_score}
+
+        # future -> (alpha the window was submitted with, whether the window was full)
+        pending = {submit(_search_root_move, position, move, depth, alpha, alpha + 1,
+                          self._remaining(deadline)): (alpha, False)
+                   for move in moves[1:]}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                window_alpha, full = pending.pop(future)
+                move, score, nodes, pv = future.result()
+                self.nodes += nodes
+                if score is None:
+                    for other in pending:
+                        other.cancel()
+                    return None
+                scores[move] = score
+                if full:
+                    # Exact above window_alpha, which alpha has only risen from
+                    if score > alpha:
+                        alpha = best_score = score
+                        best_pv = pv
+                elif score > window_alpha:
+                    # Failed high: a lower bound only, so search it properly against today's alpha
+                    pending[submit(_search_root_move, position, move, depth, alpha, INFINITY,
+                                   self._remaining(deadline))] = (alpha, True)
+        # Best first, then by the (bounded) scores for the next iteration's ordering
+        ordered = sorted(moves, key=lambda move: scores[move], reverse=True)
+        ordered.remove(best_pv[0])
+        ordered.insert(0, best_pv[0])
+        return best_score, best_pv, ordered
+
+
+BENCH_POSITIONS = ["startpos", "kiwipete", "position4", "position5", "position6"]
+
+
+def run_benchmark(depth, workers, tt_size_mb):
+    """Compare single-process and pool search time at a fixed depth; returns the overall speedup."""
+    total_single = total_parallel = 0.0
+    with ParallelSearch(workers, tt_size_mb) as parallel:
+        for name in BENCH_POSITIONS:
+            fen = REFERENCE_POSITIONS[name][0]
+            engine = Engine(tt_size_mb)
+            start = time.perf_counter()
+            single = engine.search(Position.from_fen(fen), depth)
+            single_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            multi = parallel.search(Position.from_fen(fen), depth)
+            parallel_time = time.perf_counter() - start
+
+            total_single += single_time
+            total_parallel += parallel_time
+            print(f"{name:<10} depth {depth}  1 process {single_time:7.2f}s ({move_uci(single.pv[0])})  "
+                  f"{workers} workers {parallel_time:7.2f}s ({move_uci(multi.pv[0])})  "
+                  f"speedup {single_time / parallel_time:5.2f}x")
+    speedup = total_single / total_parallel
+    print(f"total      1 process {total_single:.2f}s  {workers} workers {total_parallel:.2f}s  speedup {speedup:.2f}x")
+    return speedup
+
+
+def run_check(depth, workers, tt_size_mb):
+    """Search BENCH_POSITIONS with the pool and a single Engine; returns the number that disagree.
+
+    Both must find the same score. A different best move only passes when a
+    fresh Engine scores it the same, as a tie.
+    """
+    failures = 0
+    with ParallelSearch(workers, tt_size_mb) as parallel:
+        for name in BENCH_POSITIONS:
+            fen = REFERENCE_POSITIONS[name][0]
+            single = Engine(tt_size_mb).search(Position.from_fen(fen), depth)
+            multi = parallel.search(Position.from_fen(fen), depth)
+            status = "OK"
+            if multi.score != single.score:
+                status = f"FAIL (score {multi.score}, expected {single.score})"
+            elif multi.pv[0] != single.pv[0]:
+                tie, _ = Engine(tt_size_mb).search_move(Position.from_fen(fen), multi.pv[0], depth)
+                if tie != single.score:
+                    status = f"FAIL ({move_uci(multi.pv[0])} scores {tie}, expected {single.score})"
+                else:
+                    status = "OK (tie)"
+            failures += not status.startswith("OK")
+            print(f"{name:<10} depth {depth}  engine {move_uci(single.pv[0])} {single.score:6}  "
+                  f"pool {move_uci(multi.pv[0])} {multi.score:6}  {status}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-process root-splitting search")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--fen", default=START_FEN)
+    parser.add_argument("--movetime", type=float, default=None, help="seconds per move (hard limit)")
+    parser.add_argument("--depth", type=int, default=None)
+    parser.add_argument("--tt-mb", type=int, default=16)
+    parser.add_argument("--book", help="Polyglot opening book to consult before searching")
+    parser.add_argument("--bench", action="store_true", help="report speedup against a single process")
+    parser.add_argument("--check", action="store_true",
+                        help="check best move and score against a single process at --depth (default 3)")
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        run_benchmark(args.depth or 4, args.workers, args.tt_mb)
+        return 0
+    if args.check:
+        failures = run_check(args.depth or 3, args.workers, args.tt_mb)
+        print(f"{len(BENCH_POSITIONS) - failures}/{len(BENCH_POSITIONS)} positions agree")
+        return 1 if failures else 0
+
+    movetime = args.movetime if args.movetime is not None or args.depth else 5.0
+    book = OpeningBook(args.book) if args.book else None
+    with ParallelSearch(args.workers, args.tt_mb, book) as parallel:
+        info = parallel.search(Position.from_fen(args.fen), args.depth or 64, movetime,
+                               on_iteration=lambda info: print(format_info(info), flush=True))
+    print("bestmove", move_uci(info.pv[0]) if info.pv else "0000")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
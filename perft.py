@@ -0,0 +1,126 @@
+"""
+Perft
+Counts leaf nodes of the legal move tree for the standard reference positions.
+This is the correctness and throughput baseline for the move generator.
+random_positions() samples positions from random games; the benchmarks and
+the evaluator checks share it as their corpus.
+
+    python perft.py                   # every reference position to depth 3
+    python perft.py --depth 4 --position kiwipete
+    python perft.py --fen "<fen>" --depth 2 --divide
+"""
+import argparse
+import random
+import sys
+import time
+
+from pieces import generate_legal_moves
+from position import Position, START_FEN, make_move, unmake_move, move_uci
+
+# name -> (fen, node counts for depth 1, 2, 3, ...)
+REFERENCE_POSITIONS = {
+    "startpos": (START_FEN, (20, 400, 8902, 197281, 4865609)),
+    "kiwipete": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                 (48, 2039, 97862, 4085603)),
+    "position3": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+                  (14, 191, 2812, 43238, 674624)),
+    "position4": ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+                  (6, 264, 9467, 422333)),
+    "position5": ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+                  (44, 1486, 62379, 2103487)),
+    "position6": ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+                  (46, 2079, 89890, 3894594)),
+}
+
+
+def perft(position, depth):
+    if depth == 0:
+        return 1
+    moves = generate_legal_moves(position)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        make_move(position, move)
+        nodes += perft(position, depth - 1)
+        unmake_move(position)
+    return nodes
+
+
+def divide(position, depth):
+    """Return {move_text: node count} for each root move."""
+    counts = {}
+    for move in generate_legal_moves(position):
+        make_move(position, move)
+        counts[move_uci(move)] = perft(position, depth - 1)
+        unmake_move(position)
+    return counts
+
+
+def random_positions(count, seed=0, max_plies=200):
+    """Sample `count` positions from random games, one per ply."""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        position = Position.starting()
+        for _ in range(max_plies):
+            moves = generate_legal_moves(position)
+            if not moves or len(positions) >= count:
+                break
+            make_move(position, rng.choice(moves))
+            positions.append(Position(bytearray(position.board), position.turn, position.ep_square,
+                                      position.castling, position.halfmove))
+    return positions
+
+
+def run_perft(fen, depth):
+    """Return (nodes, seconds) for a perft of `fen` to `depth`."""
+    position = Position.from_fen(fen)
+    start = time.perf_counter()
+    nodes = perft(position, depth)
+    return nodes, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move generator perft suite")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--position", choices=sorted(REFERENCE_POSITIONS), action="append",
+                        help="reference position(s) to run; default is all of them")
+    parser.add_argument("--fen", help="run a custom position instead of the reference suite")
+    parser.add_argument("--divide", action="store_true", help="print node counts per root move")
+    args = parser.parse_args(argv)
+
+    if args.fen:
+        suite = [("custom", args.fen, ())]
+    else:
+        names = args.position or list(REFERENCE_POSITIONS)
+        suite = [(name,) + REFERENCE_POSITIONS[name] for name in names]
+
+    failures = 0
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, expected_counts in suite:
+        if args.divide:
+            for text, count in sorted(divide(Position.from_fen(fen), args.depth).items()):
+                print(f"{text}: {count}")
+        nodes, seconds = run_perft(fen, args.depth)
+        total_nodes += nodes
+        total_time += seconds
+        expected = expected_counts[args.depth - 1] if 0 < args.depth <= len(expected_counts) else None
+        if expected is None:
+            status = "----"
+        elif nodes == expected:
+            status = "OK"
+        else:
+            status = f"FAIL (expected {expected})"
+            failures += 1
+        nps = nodes / seconds if seconds > 0 else 0.0
+        print(f"{name:<10} depth {args.depth}  nodes {nodes:>10}  {seconds:8.2f}s  {nps:>10.0f} nps  {status}")
+
+    if total_time > 0:
+        print(f"total      nodes {total_nodes}  {total_time:.2f}s  {total_nodes / total_time:.0f} nps")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
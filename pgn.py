@@ -0,0 +1,246 @@
+"""
+PGN import
+Streams games out of PGN files of any size and replays them through the rules.
+The file is memory-mapped and walked one game at a time, so memory use does not
+grow with the file. Validation hands chunks of games to a process pool and
+reports the game and ply of the first illegal move in each bad game.
+
+    python pgn.py games.pgn --workers 4
+    python pgn.py games.pgn --find "<fen>"
+"""
+import argparse
+import mmap
+import os
+import re
+import sys
+import time
+
+from pieces import generate_legal_moves
+from position import Position, START_FEN, PAWN, KING, PIECE_TYPES, make_move, parse_square, piece_type
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+_TAG = re.compile(r'^\[(\w+)\s+"((?:[^"\\]|\\.)*)"\]')
+_COMMENT = re.compile(r"\{[^}]*\}|;[^\n]*")
+_MOVE_NUMBER = re.compile(r"^\d+\.+")
+_SAN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+
+_PIECE_LETTERS = {"N": PIECE_TYPES["knight"], "B": PIECE_TYPES["bishop"], "R": PIECE_TYPES["rook"],
+                  "Q": PIECE_TYPES["queen"], "K": KING}
+
+
+class IllegalMoveError(ValueError):
+    pass
+
+
+def iter_games(path):
+    """Yield (offset, game_bytes) for each game in a PGN file, one game in memory at a time."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = None
+            in_moves = False
+            while True:
+                offset = mm.tell()
+                line = mm.readline()
+                if not line:
+                    break
+                if line.startswith(b"["):
+                    # A tag after movetext starts the next game
+                    if in_moves and start is not None:
+                        yield start, mm[start:offset]
+                        start = None
+                        in_moves = False
+                    if start is None:
+                        start = offset
+                elif line.strip():
+                    if start is None:
+                        start = offset
+                    in_moves = True
+            if start is not None and in_moves:
+                yield start, mm[start:mm.size()]
+
+
+def parse_game(game):
+    """Split one game's PGN text into (headers dict, list of SAN tokens, result)."""
+    if isinstance(game, bytes):
+        game = game.decode("utf-8", errors="replace")
+    headers = {}
+    movetext = []
+    for line in game.splitlines():
+        match = _TAG.match(line) if line.startswith("[") else None
+        if match:
+            headers[match.group(1)] = match.group(2).replace('\\"', '"')
+        elif not line.startswith("%"):
+            movetext.append(line)
+
+    text = _COMMENT.sub(" ", "\n".join(movetext))
+    # Drop variations, which may nest
+    depth = 0
+    kept = []
+    for ch in text:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth = max(depth - 1, 0)
+        elif not depth:
+            kept.append(ch)
+
+    sans = []
+    result = headers.get("Result", "*")
+    for token in "".join(kept).split():
+        if token in RESULTS:
+            result = token
+            continue
+        if token.startswith("$"):
+            continue
+        token = _MOVE_NUMBER.sub("", token)
+        if token:
+            sans.append(token)
+    return headers, sans, result
+
+
+def san_to_move(position, san, legal_moves=None):
+    """Resolve a SAN string to one of the legal moves, or raise IllegalMoveError."""
+    if legal_moves is None:
+        legal_moves = generate_legal_moves(position)
+    text = san.rstrip("+#!?")
+    board = position.board
+
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        long_castle = len(text) > 3
+        for move in legal_moves:
+            from_sq = move & 63
+            to_sq = (move >> 6) & 63
+            if piece_type(board[from_sq]) == KING and to_sq - from_sq == (-2 if long_castle else 2):
+                return move
+        raise IllegalMoveError(san)
+
+    match = _SAN.match(text)
+    if not match:
+        raise IllegalMoveError(san)
+    letter, from_file, from_rank, target, promotion = match.groups()
+    ptype = _PIECE_LETTERS[letter] if letter else PAWN
+    to_sq = parse_square(target)
+    promotion = _PIECE_LETTERS[promotion] if promotion else 0
+
+    candidates = []
+    for move in legal_moves:
+        from_sq = move & 63
+        if (move >> 6) & 63 != to_sq or piece_type(board[from_sq]) != ptype or move >> 12 != promotion:
+            continue
+        if from_file and "abcdefgh"[from_sq & 7] != from_file:
+            continue
+        if from_rank and str(8 - (from_sq >> 3)) != from_rank:
+            continue
+        candidates.append(move)
+    if len(candidates) != 1:
+        raise IllegalMoveError(san)
+    return candidates[0]
+
+
+def validate_game(game, find_key=None):
+    """Replay one game. Returns (headers, plies, error, found) where error is (ply, san) or None.
+
+    `found` is the first ply at which the position has Zobrist key `find_key`, or None.
+    """
+    headers, sans, _ = parse_game(game)
+    try:
+        position = Position.from_fen(headers.get("FEN", START_FEN))
+    except ValueError:
+        return headers, 0, (0, "FEN"), None
+    found = 0 if find_key is not None and position.key == find_key else None
+    for ply, san in enumerate(sans, 1):
+        try:
+            move = san_to_move(position, san)
+        except IllegalMoveError:
+            return headers, ply - 1, (ply, san), found
+        make_move(position, move)
+        if found is None and position.key == find_key:
+            found = ply
+    return headers, len(sans), None, found
+
+
+def _validate_chunk(chunk, find_key):
+    return [(index, validate_game(game, find_key)) for index, game in chunk]
+
+
+def validate_file(path, workers=1, chunk_size=100, find_key=None, report=None):
+    """Validate every game in `path` over a process pool; returns a summary dict.
+
+    At most 2 * workers chunks are in flight, so memory stays flat for any file
+    size. `report(index, headers, error, found)` is called for each game with an
+    illegal move or a match for `find_key`.
+    """
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+    games = plies = illegal = matches = 0
+    start = time.perf_counter()
+
+    def collect(future):
+        nonlocal games, plies, illegal, matches
+        for index, (headers, game_plies, error, found) in future.result():
+            games += 1
+            plies += game_plies
+            illegal += error is not None
+            matches += found is not None
+            if report is not None and (error is not None or found is not None):
+                report(index, headers, error, found)
+
+    with ProcessPoolExecutor(workers) as pool:
+        pending = set()
+        chunk = []
+        for index, (_, game) in enumerate(iter_games(path), 1):
+            chunk.append((index, game))
+            if len(chunk) < chunk_size:
+                continue
+            pending.add(pool.submit(_validate_chunk, chunk, find_key))
+            chunk = []
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future)
+        if chunk:
+            pending.add(pool.submit(_validate_chunk, chunk, find_key))
+        for future in pending:
+            collect(future)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "games": games,
+        "plies": plies,
+        "illegal": illegal,
+        "matches": matches,
+        "seconds": elapsed,
+        "games_per_sec": games / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream and validate PGN files")
+    parser.add_argument("path")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk", type=int, default=100, help="games per worker task")
+    parser.add_argument("--find", metavar="FEN", help="report games that reach this position")
+    args = parser.parse_args(argv)
+
+    find_key = Position.from_fen(args.find).key if args.find else None
+
+    def report(index, headers, error, found):
+        name = f"{headers.get('White', '?')} - {headers.get('Black', '?')}"
+        if error is not None:
+            ply, san = error
+            print(f"game {index} ({name}): illegal move {san!r} at ply {ply}")
+        if found is not None:
+            print(f"game {index} ({name}): position reached at ply {found}")
+
+    summary = validate_file(args.path, args.workers, args.chunk, find_key, report)
+    print(f"{summary['games']} games, {summary['plies']} plies in {summary['seconds']:.2f}s "
+          f"({summary['games_per_sec']:.1f} games/sec); {summary['illegal']} with illegal moves"
+          + (f", {summary['matches']} reach the position" if find_key is not None else ""))
+    return 1 if summary["illegal"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,247 +1,387 @@
-import pygame
-import copy  # Add this import at the top
-from constants import PIECE_IMAGE_SCALE
-
-class Piece(pygame.sprite.Sprite):
-    def __init__(self, type, color, row, col):
-        super().__init__()
-        self.type = type
-        self.color = color
-        self.row = row
-        self.col = col
-
-        path = f"assets/{color}_{type}.png"
-        self.image = pygame.image.load(path).convert_alpha()
-        self.image = pygame.transform.scale(self.image, PIECE_IMAGE_SCALE)
-        self.rect = self.image.get_rect()
-        
-  
-
-
-def is_valid_move(piece, board_state, row, col, en_passant_target=None, en_passant_turn=-1, turn=0):
-    start_row = piece.row
-    start_col = piece.col
-    target = board_state[row][col]
+from attacks import (KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, ROOK_RAYS, BISHOP_RAYS, QUEEN_RAYS,
+                     is_square_attacked)
+from position import (WHITE, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING,
+                      WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE,
+                      make_piece, piece_type, piece_color, encode_move, make_move, unmake_move)
+
+
+PROMOTION_TYPES = (QUEEN, ROOK, BISHOP, KNIGHT)
+
+# (king from, king to, rook from, rook to, squares that must be empty, squares the king crosses)
+CASTLING_MOVES = {
+    WHITE_KINGSIDE: (60, 62, 63, 61, (61, 62), (60, 61)),
+    WHITE_QUEENSIDE: (60, 58, 56, 59, (57, 58, 59), (60, 59)),
+    BLACK_KINGSIDE: (4, 6, 7, 5, (5, 6), (4, 5)),
+    BLACK_QUEENSIDE: (4, 2, 0, 3, (1, 2, 3), (4, 3)),
+}
+
+
+def _path_clear(board, start_row, start_col, row, col):
+    row_step = (row > start_row) - (row < start_row)
+    col_step = (col > start_col) - (col < start_col)
+    r, c = start_row + row_step, start_col + col_step
+    while r != row or c != col:
+        if board[r * 8 + c]:
+            return False
+        r += row_step
+        c += col_step
+    return True
+
+
+def is_valid_move(position, from_sq, to_sq):
+    board = position.board
+    piece = board[from_sq]
+    if not piece:
+        return False
+    color = piece_color(piece)
+    ptype = piece_type(piece)
+    target = board[to_sq]
     # Prevent capturing own piece
-    if target is not None and target.color == piece.color:
+    if target and piece_color(target) == color:
         return False
+    start_row, start_col = divmod(from_sq, 8)
+    row, col = divmod(to_sq, 8)
+    dr = row - start_row
+    dc = col - start_col
+
     # Pawn Piece Logic
-    if piece.type == "pawn":
-        if piece.color == "white":
+    if ptype == PAWN:
+        if color == WHITE:
             direction = -1
             start_rank = 6
         else:
-            direction = 1  
+            direction = 1
             start_rank = 1
-        
+
         # Move forward 1 square
-        if row == start_row + direction and col == start_col:
-            if board_state[row][col] is None:
-                return True
-        
+        if dr == direction and dc == 0:
+            return not target
+
         # Move forward 2 squares from starting position
-        if start_row == start_rank and row == start_row + 2 * direction and col == start_col:
-            between_row = start_row + direction
-            if board_state[between_row][col] is None and board_state[row][col] is None:
-                return True  
-        
+        if start_row == start_rank and dr == 2 * direction and dc == 0:
+            return not target and not board[from_sq + 8 * direction]
+
         # Diagonal capture (normal + en passant)
-        if row == start_row + direction and abs(col - start_col) == 1:
-            # Normal capture
-            if target is not None and target.color != piece.color:
-                return True
-            
-            # En passant capture  ← ADDED THIS SECTION
-            if en_passant_target and (row, col) == en_passant_target:
-                if turn == en_passant_turn + 1:
-                    return True
-    
-            
-            
-    # Rook Piece Logic
-    if piece.type == "rook":
-        if row == start_row:
-            step = -1 if start_col > col else 1
-            for c in range(start_col + step, col, step):
-                if board_state[row][c] is not None:
-                    return False
-            if start_col != col:
-                if target is None or target.color != piece.color:
-                    return True
-        if col == start_col:
-            step = -1 if start_row > row else 1
-            for r in range(start_row + step, row, step):
-                if board_state[r][col] is not None:
-                    return False
-            if start_row != row:
-                if target is None or target.color != piece.color:
-                    return True
+        if dr == direction and abs(dc) == 1:
+            return bool(target) or to_sq == position.ep_square
+        return False
+
     # Knight Piece Logic
-    if piece.type == "knight":
-        if (abs(row - start_row) == 2 and abs(col - start_col) == 1) or (abs(col - start_col) == 2 and abs(row - start_row) == 1):
-            if target is None or target.color != piece.color:
-                return True
-    # Bishop Piece Logic
-    if piece.type == "bishop":
-        if abs(row - start_row) == abs(col - start_col): 
-            row_step = 1 if row > start_row else -1
-            col_step = 1 if col > start_col else -1
-            r, c = start_row + row_step, start_col + col_step
-            while r != row and c != col:
-                if board_state[r][c] is not None:
-                    return False  
-                r += row_step
-                c += col_step
-            if target is None or target.color != piece.color:
-                return True
-    # Queen Piece Logic
-    if piece.type == "queen":
-        # Horizontal
-        if row == start_row:
-            step = 1 if col > start_col else -1
-            for c in range(start_col + step, col, step):
-                if board_state[row][c] is not None:
-                    return False
-            if target is None or target.color != piece.color:
-                return True
-        # Vertical
-        if col == start_col:
-            step = 1 if row > start_row else -1
-            for r in range(start_row + step, row, step):
-                if board_state[r][col] is not None:
-                    return False
-            if target is None or target.color != piece.color:
-                return True
-        # Diagonal
-        if abs(row - start_row) == abs(col - start_col): 
-            row_step = 1 if row > start_row else -1
-            col_step = 1 if col > start_col else -1
-            r, c = start_row + row_step, start_col + col_step
-            while r != row and c != col:
-                if board_state[r][c] is not None:
-                    return False
-                r += row_step
-                c += col_step
-            if target is None or target.color != piece.color:
-                return True
+    if ptype == KNIGHT:
+        return (abs(dr) == 2 and abs(dc) == 1) or (abs(dr) == 1 and abs(dc) == 2)
+
     # King Piece Logic
-    if piece.type == "king":
-        if target is not None and target.color == piece.color:
-            return False
-        if abs(start_row - row) <= 1 and abs(start_col - col) <= 1:
-            return True  
-    return False
+    if ptype == KING:
+        if dr == 0 and abs(dc) == 2:
+            return _can_castle(position, color, to_sq)
+        return from_sq != to_sq and abs(dr) <= 1 and abs(dc) <= 1
+
+    # Sliding pieces: rook lines, bishop diagonals, queen both
+    straight = (dr == 0) != (dc == 0)
+    diagonal = dr != 0 and abs(dr) == abs(dc)
+    if ptype == ROOK and not straight:
+        return False
+    if ptype == BISHOP and not diagonal:
+        return False
+    if ptype == QUEEN and not (straight or diagonal):
+        return False
+    return _path_clear(board, start_row, start_col, row, col)
 
 
-def look_for_check(board_state, turn):
-    if turn % 2 == 1:
-        king_color = "white"
-        king_type = "king"
-    else:
-        king_color = "black"
-        king_type = "king"
-
-    king_row = None
-    king_col = None
-    for r in range(8):
-        for c in range(8):
-            current = board_state[r][c]
-            if current is not None and current.color == king_color and current.type == king_type:
-                king_row = r
-                king_col = c
-                break
-        if king_row is not None:
-            break
+def _castling_right(color, to_sq):
+    if color == WHITE:
+        return WHITE_KINGSIDE if to_sq == 62 else WHITE_QUEENSIDE if to_sq == 58 else 0
+    return BLACK_KINGSIDE if to_sq == 6 else BLACK_QUEENSIDE if to_sq == 2 else 0
+
 
-    if king_row is None or king_col is None:
-        print("Error: King not found on board")
+def _can_castle(position, color, to_sq):
+    right = _castling_right(color, to_sq)
+    if not right or not position.castling & right:
+        return False
+    king_from, _, rook_from, _, empty, crossed = CASTLING_MOVES[right]
+    board = position.board
+    if board[king_from] != make_piece(color, KING) or board[rook_from] != make_piece(color, ROOK):
         return False
+    if any(board[sq] for sq in empty):
+        return False
+    # The king may not castle out of or through check
+    return not any(is_square_attacked(position, sq, color ^ 1) for sq in crossed)
 
-    # Rook / Queen horizontal and vertical
-    for step in [1, -1]:
-        c = king_col + step
-        while 0 <= c < 8:
-            p = board_state[king_row][c]
-            if p is not None:
-                if p.color != king_color and p.type in ["rook", "queen"]:
-                    return True
-                break
-            c += step
-
-    for step in [1, -1]:
-        r = king_row + step
-        while 0 <= r < 8:
-            p = board_state[r][king_col]
-            if p is not None:
-                if p.color != king_color and p.type in ["rook", "queen"]:
-                    return True
+
+def look_for_check(position, color):
+    """Return True if the king of `color` is attacked; a side without a king is never in check."""
+    king_sq = position.king_squares[color]
+    if king_sq < 0:
+        return False
+    return is_square_attacked(position, king_sq, color ^ 1)
+
+
+def _king_safe_after(position, move):
+    color = position.side_to_move
+    make_move(position, move)
+    # Check if our king is in check after this move
+    in_check = look_for_check(position, color)
+    unmake_move(position)
+    return not in_check
+
+
+def is_legal_move(position, from_sq, to_sq):
+    # First check basic move validity
+    if not is_valid_move(position, from_sq, to_sq):
+        return False
+    # If move left us in check, it's illegal
+    return _king_safe_after(position, encode_move(from_sq, to_sq))
+
+
+_SLIDER_RAYS = {BISHOP: BISHOP_RAYS, ROOK: ROOK_RAYS, QUEEN: QUEEN_RAYS}
+
+
+def _piece_moves(position, from_sq, moves):
+    """Append the pseudo-legal moves of the piece on `from_sq` to `moves`."""
+    board = position.board
+    piece = board[from_sq]
+    color = piece >> 3
+    own = piece & 8
+    ptype = piece & 7
+
+    if ptype == PAWN:
+        direction = -8 if color == WHITE else 8
+        one = from_sq + direction
+        last_rank = one < 8 or one >= 56
+        if not board[one]:
+            if last_rank:
+                moves.extend(from_sq | one << 6 | promo << 12 for promo in PROMOTION_TYPES)
+            else:
+                moves.append(from_sq | one << 6)
+                if from_sq >> 3 == (6 if color == WHITE else 1) and not board[one + direction]:
+                    moves.append(from_sq | (one + direction) << 6)
+        for to_sq in PAWN_ATTACKS[color][from_sq]:
+            target = board[to_sq]
+            if target and target & 8 != own:
+                if last_rank:
+                    moves.extend(from_sq | to_sq << 6 | promo << 12 for promo in PROMOTION_TYPES)
+                else:
+                    moves.append(from_sq | to_sq << 6)
+            elif to_sq == position.ep_square:
+                moves.append(from_sq | to_sq << 6)
+        return
+
+    if ptype == KNIGHT or ptype == KING:
+        for to_sq in KNIGHT_ATTACKS[from_sq] if ptype == KNIGHT else KING_ATTACKS[from_sq]:
+            target = board[to_sq]
+            if not target or target & 8 != own:
+                moves.append(from_sq | to_sq << 6)
+        if ptype == KING and position.castling:
+            for right in ((WHITE_KINGSIDE, WHITE_QUEENSIDE) if color == WHITE else (BLACK_KINGSIDE, BLACK_QUEENSIDE)):
+                to_sq = CASTLING_MOVES[right][1]
+                if position.castling & right and from_sq == CASTLING_MOVES[right][0] and _can_castle(position, color, to_sq):
+                    moves.append(from_sq | to_sq << 6)
+        return
+
+    for ray in _SLIDER_RAYS[ptype][from_sq]:
+        for to_sq in ray:
+            target = board[to_sq]
+            if target:
+                if target & 8 != own:
+                    moves.append(from_sq | to_sq << 6)
                 break
-            r += step
-
-    # Bishop / Queen diagonals
-    directions = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
-    for dr, dc in directions:
-        r, c = king_row + dr, king_col + dc
-        while 0 <= r < 8 and 0 <= c < 8:
-            p = board_state[r][c]
-            if p is not None:
-                if p.color != king_color and p.type in ["bishop", "queen"]:
-                    return True
+            moves.append(from_sq | to_sq << 6)
+
+
+def _pseudo_legal_moves(position):
+    board = position.board
+    own = position.side_to_move << 3
+    moves = []
+    for from_sq in range(64):
+        piece = board[from_sq]
+        if piece and piece & 8 == own:
+            _piece_moves(position, from_sq, moves)
+    return moves
+
+
+def generate_legal_moves(position):
+    """Return every legal move for the side to move as encoded move ints."""
+    return [move for move in _pseudo_legal_moves(position) if _king_safe_after(position, move)]
+
+
+def _piece_captures(position, from_sq, moves):
+    """Append the pseudo-legal captures and promotions of the piece on `from_sq` to `moves`."""
+    board = position.board
+    piece = board[from_sq]
+    own = piece & 8
+    ptype = piece & 7
+
+    if ptype == PAWN:
+        color = piece >> 3
+        one = from_sq + (-8 if color == WHITE else 8)
+        last_rank = one < 8 or one >= 56
+        if last_rank and not board[one]:
+            moves.extend(from_sq | one << 6 | promo << 12 for promo in PROMOTION_TYPES)
+        for to_sq in PAWN_ATTACKS[color][from_sq]:
+            target = board[to_sq]
+            if target and target & 8 != own:
+                if last_rank:
+                    moves.extend(from_sq | to_sq << 6 | promo << 12 for promo in PROMOTION_TYPES)
+                else:
+                    moves.append(from_sq | to_sq << 6)
+            elif to_sq == position.ep_square:
+                moves.append(from_sq | to_sq << 6)
+        return
+
+    if ptype == KNIGHT or ptype == KING:
+        for to_sq in KNIGHT_ATTACKS[from_sq] if ptype == KNIGHT else KING_ATTACKS[from_sq]:
+            target = board[to_sq]
+            if target and target & 8 != own:
+                moves.append(from_sq | to_sq << 6)
+        return
+
+    for ray in _SLIDER_RAYS[ptype][from_sq]:
+        for to_sq in ray:
+            target = board[to_sq]
+            if target:
+                if target & 8 != own:
+                    moves.append(from_sq | to_sq << 6)
                 break
-            r += dr
-            c += dc
-
-    # Knight
-    knight_moves = [(2,1),(1,2),(-1,2),(-2,1),(-2,-1),(-1,-2),(1,-2),(2,-1)]
-    for dr, dc in knight_moves:
-        r, c = king_row + dr, king_col + dc
-        if 0 <= r < 8 and 0 <= c < 8:
-            p = board_state[r][c]
-            if p is not None and p.color != king_color and p.type == "knight":
-                return True
 
-    # Pawn
-    if king_color == "white":
-        pawn_row = king_row - 1
-        pawn_cols = [king_col - 1, king_col + 1]
-    else:
-        pawn_row = king_row + 1
-        pawn_cols = [king_col - 1, king_col + 1]
-
-    for c in pawn_cols:
-        if 0 <= pawn_row < 8 and 0 <= c < 8:
-            p = board_state[pawn_row][c]
-            if p is not None and p.color != king_color and p.type == "pawn":
+
+def generate_captures(position, legal=True):
+    """Return the captures (en passant included) and promotions for the side to move.
+
+    With legal=False moves that leave the king in check are kept; the
+    quiescence search prunes first and only checks the survivors.
+    """
+    board = position.board
+    own = position.side_to_move << 3
+    moves = []
+    for from_sq in range(64):
+        piece = board[from_sq]
+        if piece and piece & 8 == own:
+            _piece_captures(position, from_sq, moves)
+    if legal:
+        return [move for move in moves if _king_safe_after(position, move)]
+    return moves
+
+
+# game_status results
+ONGOING = "ongoing"
+CHECKMATE = "checkmate"
+STALEMATE = "stalemate"
+INSUFFICIENT_MATERIAL = "insufficient material"
+FIFTY_MOVES = "fifty-move rule"
+THREEFOLD_REPETITION = "threefold repetition"
+
+
+def _checkers(position, king_sq, color):
+    """Squares of the enemy pieces giving check to the king of `color` on `king_sq`."""
+    board = position.board
+    enemy = (color ^ 1) << 3
+    found = [sq for sq in KNIGHT_ATTACKS[king_sq] if board[sq] == enemy | KNIGHT]
+    found.extend(sq for sq in PAWN_ATTACKS[color][king_sq] if board[sq] == enemy | PAWN)
+    for rays, kind in ((ROOK_RAYS, ROOK), (BISHOP_RAYS, BISHOP)):
+        for ray in rays[king_sq]:
+            for sq in ray:
+                piece = board[sq]
+                if piece:
+                    if piece == enemy | kind or piece == enemy | QUEEN:
+                        found.append(sq)
+                    break
+    return found
+
+
+def _between(from_sq, to_sq):
+    """Squares strictly between two squares on a line, or () if they are not aligned."""
+    row, col = divmod(from_sq, 8)
+    dr = (to_sq >> 3) - row
+    dc = (to_sq & 7) - col
+    if dr and dc and abs(dr) != abs(dc):
+        return ()
+    step = ((dr > 0) - (dr < 0)) * 8 + (dc > 0) - (dc < 0)
+    return tuple(range(from_sq + step, to_sq, step))
+
+
+def has_legal_move(position):
+    """Return True as soon as one legal move is found for the side to move.
+
+    In check, king escapes come first, then captures of the checker and blocks
+    on its ray; other moves cannot help. Out of check, pieces are tried one at
+    a time and the search stops at the first legal move.
+    """
+    board = position.board
+    color = position.side_to_move
+    own = color << 3
+    king_sq = position.king_squares[color]
+    checkers = _checkers(position, king_sq, color) if king_sq >= 0 else []
+
+    if checkers:
+        for to_sq in KING_ATTACKS[king_sq]:
+            target = board[to_sq]
+            if (not target or target & 8 != own) and _king_safe_after(position, king_sq | to_sq << 6):
                 return True
+        if len(checkers) > 1:
+            # Double check: only the king can move
+            return False
+        checker = checkers[0]
+        targets = [checker]
+        if board[checker] & 7 == PAWN and position.ep_square >= 0:
+            # A pawn that just moved two squares can also be taken en passant
+            targets.append(position.ep_square)
+        if board[checker] & 7 in (BISHOP, ROOK, QUEEN):
+            targets.extend(_between(checker, king_sq))
+        for from_sq in range(64):
+            piece = board[from_sq]
+            if not piece or piece & 8 != own or from_sq == king_sq:
+                continue
+            for to_sq in targets:
+                if not is_valid_move(position, from_sq, to_sq):
+                    continue
+                # A promotion is legal with every piece if it is legal with one
+                promotion = QUEEN if piece & 7 == PAWN and (to_sq < 8 or to_sq >= 56) else 0
+                if _king_safe_after(position, encode_move(from_sq, to_sq, promotion)):
+                    return True
+        return False
 
+    moves = []
+    for from_sq in range(64):
+        piece = board[from_sq]
+        if not piece or piece & 8 != own:
+            continue
+        del moves[:]
+        _piece_moves(position, from_sq, moves)
+        for move in moves:
+            if _king_safe_after(position, move):
+                return True
     return False
 
 
-def is_legal_move(piece, board_state, row, col, en_passant_target=None, en_passant_turn=-1, turn=0):
-    # First check basic move validity
-    if not is_valid_move(piece, board_state, row, col, en_passant_target, en_passant_turn, turn):
-        return False
-    
-    # --- TEMPORARILY make the move on the REAL board ---
-    old_row = piece.row
-    old_col = piece.col
-    captured_piece = board_state[row][col]
-    
-    # Move the piece
-    board_state[old_row][old_col] = None
-    board_state[row][col] = piece
-    piece.row = row
-    piece.col = col
-    
-    # Check if our king is in check after this move
-    in_check = look_for_check(board_state, turn + 1)
-    
-    # UNDO MOVE
-    piece.row = old_row
-    piece.col = old_col
-    board_state[old_row][old_col] = piece
-    board_state[row][col] = captured_piece
-    
-    # If move left us in check, it's illegal
-    return not in_check
+def insufficient_material(position):
+    """True when neither side can ever mate: lone kings, a single minor piece, or bishops all on one color."""
+    minors = []
+    for sq, piece in enumerate(position.board):
+        ptype = piece & 7
+        if ptype == KNIGHT or ptype == BISHOP:
+            minors.append((ptype, sq))
+        elif piece and ptype != KING:
+            return False
+    if len(minors) <= 1:
+        return True
+    # Any number of bishops confined to squares of one color cannot mate
+    shades = {((sq >> 3) + (sq & 7)) & 1 for ptype, sq in minors if ptype == BISHOP}
+    return all(ptype == BISHOP for ptype, _ in minors) and len(shades) == 1
+
+
+def game_status(position):
+    """Return ONGOING or the reason the game is over.
 
+    Mate and stalemate are decided with has_legal_move, so an ongoing game
+    costs one legal move, not the whole move list. Repetitions are counted from
+    the position's own history.
+    """
+    if not has_legal_move(position):
+        return CHECKMATE if look_for_check(position, position.side_to_move) else STALEMATE
+    if insufficient_material(position):
+        return INSUFFICIENT_MATERIAL
+    if position.halfmove >= 100:
+        return FIFTY_MOVES
+    if position.repetitions(3) >= 3:
+        return THREEFOLD_REPETITION
+    return ONGOING
@@ -0,0 +1,346 @@
+"""
+Position
+Pure-Python board representation used by the rules, independent of pygame.
+
+Squares are indexed 0..63 as row * 8 + col, with row 0 being black's back
+rank, matching the (row, col) coordinates used by the GUI. Each square holds
+a small int: 0 for empty, otherwise piece type | (color << 3).
+
+A move is a 16-bit int: from_sq | to_sq << 6 | promotion << 12. make_move
+and unmake_move apply moves in place and keep one packed int per ply on
+Position.stack, which doubles as the move history.
+"""
+from array import array
+
+from zobrist import PIECE_KEYS, SIDE_KEY, CASTLING_KEYS, EP_FILE_KEYS, compute_key
+
+WHITE = 0
+BLACK = 1
+
+EMPTY = 0
+PAWN = 1
+KNIGHT = 2
+BISHOP = 3
+ROOK = 4
+QUEEN = 5
+KING = 6
+
+COLOR_NAMES = ("white", "black")
+PIECE_NAMES = (None, "pawn", "knight", "bishop", "rook", "queen", "king")
+PIECE_TYPES = {name: ptype for ptype, name in enumerate(PIECE_NAMES) if name}
+
+# Castling rights bitmask
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+ALL_CASTLING = 15
+
+NO_SQUARE = -1
+
+# Castling rights that survive a move touching each square (king and rook homes)
+CASTLING_MASK = [ALL_CASTLING] * 64
+CASTLING_MASK[60] = ALL_CASTLING & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASK[63] = ALL_CASTLING & ~WHITE_KINGSIDE
+CASTLING_MASK[56] = ALL_CASTLING & ~WHITE_QUEENSIDE
+CASTLING_MASK[4] = ALL_CASTLING & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASK[7] = ALL_CASTLING & ~BLACK_KINGSIDE
+CASTLING_MASK[0] = ALL_CASTLING & ~BLACK_QUEENSIDE
+
+# King destination of a castling move -> (rook from, rook to)
+CASTLING_ROOKS = {62: (63, 61), 58: (56, 59), 6: (7, 5), 2: (0, 3)}
+
+BACK_RANK = (ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK)
+
+
+def make_piece(color, ptype):
+    return ptype | (color << 3)
+
+
+def piece_type(piece):
+    return piece & 7
+
+
+def piece_color(piece):
+    return piece >> 3
+
+
+def square(row, col):
+    return row * 8 + col
+
+
+def square_name(sq):
+    return "abcdefgh"[sq & 7] + str(8 - (sq >> 3))
+
+
+def parse_square(name):
+    return square(8 - int(name[1]), "abcdefgh".index(name[0]))
+
+
+def encode_move(from_sq, to_sq, promotion=0):
+    return from_sq | to_sq << 6 | promotion << 12
+
+
+def move_from(move):
+    return move & 63
+
+
+def move_to(move):
+    return (move >> 6) & 63
+
+
+def move_promotion(move):
+    return move >> 12
+
+
+def move_uci(move):
+    text = square_name(move & 63) + square_name((move >> 6) & 63)
+    if move >> 12:
+        text += " pnbrqk"[move >> 12]
+    return text
+
+
+def parse_uci(text):
+    promotion = " pnbrqk".index(text[4]) if len(text) > 4 else 0
+    return encode_move(parse_square(text[:2]), parse_square(text[2:4]), promotion)
+
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+_FEN_CASTLING = (("K", WHITE_KINGSIDE), ("Q", WHITE_QUEENSIDE), ("k", BLACK_KINGSIDE), ("q", BLACK_QUEENSIDE))
+
+
+class Position:
+    __slots__ = ("board", "turn", "ep_square", "castling", "halfmove", "stack", "key", "key_stack",
+                 "king_squares")
+
+    def __init__(self, board=None, turn=0, ep_square=NO_SQUARE, castling=ALL_CASTLING, halfmove=0,
+                 stack=None, key_stack=None):
+        self.board = bytearray(64) if board is None else bytearray(board)
+        # Ply counter; even turns are white to move, as in the GUI loop
+        self.turn = turn
+        self.ep_square = ep_square
+        self.castling = castling
+        self.halfmove = halfmove
+        # Undo records, one per move made: see make_move
+        self.stack = array("Q") if stack is None else array("Q", stack)
+        # Zobrist key, and the key before each move on the stack
+        self.key = compute_key(self)
+        self.key_stack = array("Q") if key_stack is None else array("Q", key_stack)
+        # Square of each king, indexed by color (NO_SQUARE if missing)
+        self.king_squares = [self._find_king(WHITE), self._find_king(BLACK)]
+
+    @classmethod
+    def starting(cls):
+        board = bytearray(64)
+        for col, ptype in enumerate(BACK_RANK):
+            board[col] = make_piece(BLACK, ptype)
+            board[8 + col] = make_piece(BLACK, PAWN)
+            board[48 + col] = make_piece(WHITE, PAWN)
+            board[56 + col] = make_piece(WHITE, ptype)
+        return cls(board)
+
+    @classmethod
+    def from_fen(cls, fen):
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f"Invalid FEN: {fen!r}")
+        rows = fields[0].split("/")
+        if len(rows) != 8:
+            raise ValueError(f"Invalid FEN board: {fields[0]!r}")
+        board = bytearray(64)
+        for row, text in enumerate(rows):
+            col = 0
+            for ch in text:
+                if ch.isdigit():
+                    col += int(ch)
+                    continue
+                ptype = " pnbrqk".find(ch.lower())
+                if ptype <= 0 or col > 7:
+                    raise ValueError(f"Invalid FEN board: {fields[0]!r}")
+                board[row * 8 + col] = make_piece(WHITE if ch.isupper() else BLACK, ptype)
+                col += 1
+            if col != 8:
+                raise ValueError(f"Invalid FEN board: {fields[0]!r}")
+        if fields[1] not in ("w", "b"):
+            raise ValueError(f"Invalid FEN side to move: {fields[1]!r}")
+        castling = 0
+        for letter, right in _FEN_CASTLING:
+            if letter in fields[2]:
+                castling |= right
+        ep_square = NO_SQUARE if fields[3] == "-" else parse_square(fields[3])
+        halfmove = int(fields[4]) if len(fields) > 4 else 0
+        fullmove = int(fields[5]) if len(fields) > 5 else 1
+        turn = (fullmove - 1) * 2 + (fields[1] == "b")
+        return cls(board, turn, ep_square, castling, halfmove)
+
+    def fen(self):
+        rows = []
+        for row in range(8):
+            text = ""
+            empty = 0
+            for col in range(8):
+                piece = self.board[row * 8 + col]
+                if not piece:
+                    empty += 1
+                    continue
+                if empty:
+                    text += str(empty)
+                    empty = 0
+                letter = " PNBRQK"[piece_type(piece)]
+                text += letter if piece_color(piece) == WHITE else letter.lower()
+            if empty:
+                text += str(empty)
+            rows.append(text)
+        castling = "".join(letter for letter, right in _FEN_CASTLING if self.castling & right) or "-"
+        ep = "-" if self.ep_square == NO_SQUARE else square_name(self.ep_square)
+        side = "wb"[self.side_to_move]
+        return f"{'/'.join(rows)} {side} {castling} {ep} {self.halfmove} {self.turn // 2 + 1}"
+
+    def _find_king(self, color):
+        king = make_piece(color, KING)
+        return self.board.index(king) if king in self.board else NO_SQUARE
+
+    @property
+    def side_to_move(self):
+        return self.turn & 1
+
+    def copy(self):
+        return Position(self.board, self.turn, self.ep_square, self.castling, self.halfmove,
+                        self.stack, self.key_stack)
+
+    def history(self):
+        """Return the moves made on this position, oldest first."""
+        return [record & 0xFFFF for record in self.stack]
+
+    def repetitions(self, limit=None):
+        """How many times this position has occurred, counting itself; stops counting at `limit`.
+
+        Only positions since the last capture or pawn move (as counted by the
+        halfmove clock) with the same side to move can repeat, so the scan
+        steps back two plies at a time and no further than that.
+        """
+        keys = self.key_stack
+        key = self.key
+        count = 1
+        for index in range(len(keys) - 2, max(len(keys) - self.halfmove, 0) - 1, -2):
+            if keys[index] == key:
+                count += 1
+                if count == limit:
+                    break
+        return count
+
+    def piece_at(self, row, col):
+        return self.board[row * 8 + col]
+
+    def __eq__(self, other):
+        if not isinstance(other, Position):
+            return NotImplemented
+        return (self.board == other.board and self.side_to_move == other.side_to_move
+                and self.ep_square == other.ep_square and self.castling == other.castling)
+
+    __hash__ = None
+
+    def __str__(self):
+        rows = []
+        for row in range(8):
+            line = []
+            for col in range(8):
+                piece = self.board[row * 8 + col]
+                if piece:
+                    letter = " PNBRQK"[piece_type(piece)]
+                    line.append(letter if piece_color(piece) == WHITE else letter.lower())
+                else:
+                    line.append(".")
+            rows.append(" ".join(line))
+        return "\n".join(rows)
+
+    def __repr__(self):
+        return f"<Position turn={self.turn} ep={self.ep_square} castling={self.castling}>"
+
+
+def make_move(position, move):
+    """Apply `move` in place and push its undo record onto position.stack.
+
+    The record packs the move, the captured piece, the previous en passant
+    square, castling rights and halfmove clock into a single int. The
+    Zobrist key is updated incrementally and the old one saved on key_stack.
+    """
+    board = position.board
+    from_sq = move & 63
+    to_sq = (move >> 6) & 63
+    promotion = move >> 12
+    piece = board[from_sq]
+    captured = board[to_sq]
+    ep_square = position.ep_square
+    castling = position.castling
+    key = position.key
+    position.stack.append(move | captured << 16 | (ep_square + 1) << 20
+                          | castling << 27 | position.halfmove << 31)
+    position.key_stack.append(key)
+
+    moved = (piece & 8) | promotion if promotion else piece
+    board[from_sq] = 0
+    board[to_sq] = moved
+    key ^= PIECE_KEYS[piece][from_sq] ^ PIECE_KEYS[moved][to_sq] ^ SIDE_KEY
+    if captured:
+        key ^= PIECE_KEYS[captured][to_sq]
+    if ep_square >= 0:
+        key ^= EP_FILE_KEYS[ep_square & 7]
+    position.ep_square = NO_SQUARE
+    ptype = piece & 7
+    if ptype == PAWN:
+        position.halfmove = 0
+        if to_sq == ep_square:
+            # En passant: the captured pawn sits beside the target square
+            captured_sq = to_sq + 8 if piece < 8 else to_sq - 8
+            board[captured_sq] = 0
+            key ^= PIECE_KEYS[piece ^ 8][captured_sq]
+        elif to_sq - from_sq in (16, -16):
+            position.ep_square = (from_sq + to_sq) >> 1
+            key ^= EP_FILE_KEYS[to_sq & 7]
+    else:
+        position.halfmove = 0 if captured else position.halfmove + 1
+        if ptype == KING:
+            position.king_squares[piece >> 3] = to_sq
+            if to_sq - from_sq in (2, -2):
+                rook_from, rook_to = CASTLING_ROOKS[to_sq]
+                rook = board[rook_from]
+                board[rook_to] = rook
+                board[rook_from] = 0
+                key ^= PIECE_KEYS[rook][rook_from] ^ PIECE_KEYS[rook][rook_to]
+    castling &= CASTLING_MASK[from_sq] & CASTLING_MASK[to_sq]
+    if castling != position.castling:
+        key ^= CASTLING_KEYS[position.castling] ^ CASTLING_KEYS[castling]
+        position.castling = castling
+    position.key = key
+    position.turn += 1
+
+
+def unmake_move(position):
+    """Take back the last move made on `position` and return it."""
+    record = position.stack.pop()
+    position.key = position.key_stack.pop()
+    board = position.board
+    from_sq = record & 63
+    to_sq = (record >> 6) & 63
+    position.ep_square = ((record >> 20) & 127) - 1
+    position.castling = (record >> 27) & 15
+    position.halfmove = record >> 31
+    position.turn -= 1
+
+    piece = board[to_sq]
+    if (record >> 12) & 15:
+        piece = (piece & 8) | PAWN
+    board[from_sq] = piece
+    board[to_sq] = (record >> 16) & 15
+    ptype = piece & 7
+    if ptype == PAWN and to_sq == position.ep_square:
+        board[to_sq + 8 if piece < 8 else to_sq - 8] = piece ^ 8
+    elif ptype == KING:
+        position.king_squares[piece >> 3] = from_sq
+        if to_sq - from_sq in (2, -2):
+            rook_from, rook_to = CASTLING_ROOKS[to_sq]
+            board[rook_from] = board[rook_to]
+            board[rook_to] = 0
+    return record & 0xFFFF
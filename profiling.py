@@ -0,0 +1,221 @@
+"""
+Profiling
+Timers, counters and gauges for the rules, render and UI hot paths.
+
+A disabled Profiler costs nothing on the rules paths: the hooked functions are
+only swapped for timed wrappers while it is enabled, and the originals are put
+back, in every project module that imported them, when it is disabled. Frame
+sections use timer(), which hands back a shared no-op context while disabled.
+
+Collected data can be written as JSON (per-timer counts, totals and
+percentiles of the recent samples) or, when the profiler was enabled with
+cprofile=True, as a cProfile stats file for pstats or snakeviz.
+"""
+import cProfile
+import functools
+import importlib
+import json
+import os
+import sys
+import time
+from collections import deque
+from contextlib import nullcontext
+
+# Functions timed while profiling, as "module.function" or "module.Class.method"
+DEFAULT_HOOKS = (
+    "pieces.is_valid_move",
+    "pieces.is_legal_move",
+    "pieces.look_for_check",
+    "pieces.generate_legal_moves",
+    "pieces.game_status",
+    "board.LegalMoveCache.targets",
+)
+
+# Recent samples kept per timer for percentiles
+SAMPLE_SIZE = 1000
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+_DISABLED = nullcontext()
+
+
+class Stat:
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=SAMPLE_SIZE)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.samples.append(seconds)
+
+    def percentile(self, fraction):
+        """Percentile of the recent samples in seconds, 0.0 when there are none."""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1e3,
+            "mean_us": self.total / self.count * 1e6 if self.count else 0.0,
+            "p50_us": self.percentile(0.50) * 1e6,
+            "p95_us": self.percentile(0.95) * 1e6,
+            "p99_us": self.percentile(0.99) * 1e6,
+            "max_us": self.max * 1e6,
+        }
+
+
+class _Timer:
+    __slots__ = ("stat", "start")
+
+    def __init__(self, stat):
+        self.stat = stat
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stat.add(time.perf_counter() - self.start)
+
+
+def _resolve(path):
+    """(owner, attribute name) for a hook path; the owner is a module or a class."""
+    parts = path.split(".")
+    owner = importlib.import_module(parts[0])
+    for part in parts[1:-1]:
+        owner = getattr(owner, part)
+    return owner, parts[-1]
+
+
+def _rebind(original, replacement):
+    """Point every project module name bound to `original` at `replacement`."""
+    for module in list(sys.modules.values()):
+        path = getattr(module, "__file__", None)
+        if not path or os.path.dirname(os.path.abspath(path)) != _ROOT:
+            continue
+        namespace = module.__dict__
+        for name, value in list(namespace.items()):
+            if value is original:
+                namespace[name] = replacement
+
+
+class Profiler:
+    def __init__(self, hooks=DEFAULT_HOOKS):
+        self.hooks = hooks
+        self.enabled = False
+        self.stats = {}
+        self.counters = {}
+        self.gauges = {}
+        self._timers = {}
+        self._patched = []
+        self._cprofile = None
+        self._started = None
+
+    def stat(self, name):
+        stat = self.stats.get(name)
+        if stat is None:
+            stat = self.stats[name] = Stat()
+        return stat
+
+    def timer(self, name):
+        """Context manager timing a section under `name`; a no-op while disabled."""
+        if not self.enabled:
+            return _DISABLED
+        timer = self._timers.get(name)
+        if timer is None:
+            timer = self._timers[name] = _Timer(self.stat(name))
+        return timer
+
+    def record(self, name, seconds):
+        """Add a duration measured elsewhere, such as the frame interval."""
+        if self.enabled:
+            self.stat(name).add(seconds)
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name, value):
+        if self.enabled:
+            self.gauges[name] = value
+
+    def enable(self, cprofile=False):
+        """Start collecting: hook the rules functions, and run cProfile too if asked."""
+        if self.enabled:
+            return
+        for path in self.hooks:
+            owner, name = _resolve(path)
+            original = getattr(owner, name)
+            wrapper = self._wrap(path.split(".", 1)[1], original)
+            setattr(owner, name, wrapper)
+            if not isinstance(owner, type):
+                _rebind(original, wrapper)
+            self._patched.append((owner, name, original, wrapper))
+        if cprofile:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        self._started = time.perf_counter()
+        self.enabled = True
+
+    def disable(self):
+        """Stop collecting and restore the original functions; the data is kept."""
+        if not self.enabled:
+            return
+        for owner, name, original, wrapper in reversed(self._patched):
+            setattr(owner, name, original)
+            if not isinstance(owner, type):
+                _rebind(wrapper, original)
+        self._patched = []
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        self.enabled = False
+
+    def _wrap(self, name, function):
+        stat = self.stat(name)
+        perf_counter = time.perf_counter
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stat.add(perf_counter() - start)
+
+        return timed
+
+    def reset(self):
+        self.stats.clear()
+        self.counters.clear()
+        self.gauges.clear()
+        self._timers.clear()
+        self._started = time.perf_counter() if self.enabled else None
+
+    def report(self):
+        """Everything collected so far as a JSON-ready dict."""
+        return {
+            "elapsed_s": time.perf_counter() - self._started if self._started is not None else 0.0,
+            "timers": {name: stat.summary() for name, stat in sorted(self.stats.items()) if stat.count},
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+        }
+
+    def dump(self, path):
+        """Write the timers as JSON, or the cProfile stats when `path` ends in .prof or .pstats."""
+        if path.endswith((".prof", ".pstats")):
+            if self._cprofile is None:
+                raise ValueError("cProfile was not enabled; call enable(cprofile=True)")
+            self._cprofile.dump_stats(path)
+        else:
+            with open(path, "w") as out:
+                json.dump(self.report(), out, indent=2)
@@ -0,0 +1,79 @@
+"""
+Game record
+A game on top of its Position: the moves played are the position's undo
+stack and the Zobrist key of every earlier position is its key_stack, so the
+record adds nothing per ply beyond those two arrays (16 bytes a ply) and holds
+no per-move Python objects. Only the redo line is kept here, as 16-bit move
+ints in an array('H').
+
+There is no separate array('H') of played moves next to key_stack: each move
+is already the low 16 bits of its packed undo record in the array('Q') stack,
+which history() masks out. A second log would store every move twice and
+have to be kept in step by make_move and unmake_move on the search's hot path.
+
+Undo and redo are O(1): undone moves wait on the redo array until a different
+move is played. Repetition checks are Position.repetitions(), which only scans
+back to the last irreversible move (a capture or pawn move, as counted by the
+halfmove clock), and only at positions with the same side to move.
+"""
+from array import array
+
+from position import Position, make_move, unmake_move
+
+
+class GameRecord:
+    __slots__ = ("position", "redo_moves")
+
+    def __init__(self, position=None):
+        self.position = Position.starting() if position is None else position
+        self.redo_moves = array("H")
+
+    def __len__(self):
+        return len(self.position.stack)
+
+    @property
+    def can_undo(self):
+        return bool(self.position.stack)
+
+    @property
+    def can_redo(self):
+        return bool(self.redo_moves)
+
+    def moves(self):
+        """The moves played so far, oldest first."""
+        return self.position.history()
+
+    def push(self, move):
+        """Play a legal move. Playing the move that redo would replay keeps the rest of the redo line."""
+        make_move(self.position, move)
+        if self.redo_moves and self.redo_moves[-1] == move:
+            self.redo_moves.pop()
+        else:
+            del self.redo_moves[:]
+
+    def undo(self):
+        """Take back the last move and return it, or None at the start of the game."""
+        if not self.position.stack:
+            return None
+        move = unmake_move(self.position)
+        self.redo_moves.append(move)
+        return move
+
+    def redo(self):
+        """Replay the last undone move and return it, or None if there is nothing to redo."""
+        if not self.redo_moves:
+            return None
+        move = self.redo_moves[-1]
+        self.push(move)
+        return move
+
+    def repetitions(self):
+        """How many times the current position has occurred, counting this one."""
+        return self.position.repetitions()
+
+    def is_threefold_repetition(self):
+        return self.position.repetitions(3) >= 3
+
+    def is_fifty_moves(self):
+        """True once fifty moves by each side have passed without a capture or pawn move."""
+        return self.position.halfmove >= 100
@@ -0,0 +1,67 @@
+"""
+Static exchange evaluation
+What a capture wins once the exchange on its target square is played out,
+with each side recapturing with its least valuable attacker and free to stop
+when going on would lose material. The attacker sets come from
+attacks.attackers() on a scratch copy of the board; pieces that have already
+captured are taken off it, so rooks, bishops and queens lined up behind them
+(x-rays) join the exchange in turn.
+
+The quiescence search uses it to skip losing captures and to try the best
+ones first.
+"""
+from attacks import attackers
+from evaluate import PIECE_VALUES
+from position import PAWN, QUEEN, KING
+
+# The king's value only has to outweigh everything it could win
+SEE_VALUES = PIECE_VALUES[:KING] + (20000,)
+
+_PROMOTION_GAIN = SEE_VALUES[QUEEN] - SEE_VALUES[PAWN]
+
+
+def see(position, move):
+    """Material `move` wins in centipawns for the side playing it, negative when the exchange loses."""
+    board = bytearray(position.board)
+    from_sq = move & 63
+    to_sq = (move >> 6) & 63
+    promotion = move >> 12
+    piece = board[from_sq]
+    captured = board[to_sq] & 7
+    if piece & 7 == PAWN and to_sq == position.ep_square:
+        board[to_sq + 8 if piece < 8 else to_sq - 8] = 0
+        captured = PAWN
+    gain = [SEE_VALUES[captured]]
+    if promotion:
+        gain[0] += SEE_VALUES[promotion] - SEE_VALUES[PAWN]
+        on_square = SEE_VALUES[promotion]
+    else:
+        on_square = SEE_VALUES[piece & 7]
+    board[from_sq] = 0
+    board[to_sq] = piece
+    last_rank = to_sq < 8 or to_sq >= 56
+
+    color = (piece >> 3) ^ 1
+    while True:
+        squares = attackers(board, to_sq, color)
+        if not squares:
+            break
+        # Piece types are numbered in order of value, so the lowest code is the cheapest attacker
+        from_sq = min(squares, key=lambda sq: board[sq] & 7)
+        ptype = board[from_sq] & 7
+        if ptype == KING and attackers(board, to_sq, color ^ 1):
+            break
+        gain.append(on_square - gain[-1])
+        on_square = SEE_VALUES[ptype]
+        if ptype == PAWN and last_rank:
+            gain[-1] += _PROMOTION_GAIN
+            on_square = SEE_VALUES[QUEEN]
+        board[to_sq] = board[from_sq]
+        board[from_sq] = 0
+        color ^= 1
+
+    # Walk back up: each side takes the better of standing pat and recapturing
+    while len(gain) > 1:
+        last = gain.pop()
+        gain[-1] = -max(-gain[-1], last)
+    return gain[0]
@@ -0,0 +1,142 @@
+"""
+Self-play
+Plays batches of headless games (random vs random, or engine vs engine) across
+a process pool and streams them out as PGN. Game i is seeded with seed + i, so
+a run with the same arguments reproduces the same games in the same order no
+matter how many workers play them.
+
+    python selfplay.py --games 1000 --workers 4 --seed 1 > games.pgn
+    python selfplay.py --games 20 --mode engine --depth 2 --random-plies 4 -o games.pgn
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import Engine
+from notation import move_to_san, format_pgn
+from pieces import generate_legal_moves, game_status, ONGOING, CHECKMATE
+from position import Position, START_FEN, make_move
+
+
+def play_game(index, seed, mode="random", fen=START_FEN, depth=2, random_plies=0, max_plies=400):
+    """Play one game and return a dict with its result, length and PGN text."""
+    rng = random.Random(seed)
+    position = Position.from_fen(fen)
+    first_turn = position.turn
+    engine = Engine(tt_size_mb=4) if mode == "engine" else None
+    san_moves = []
+    outcome = None
+    while outcome is None:
+        status = game_status(position)
+        if status != ONGOING:
+            if status == CHECKMATE:
+                outcome = ("0-1" if position.turn & 1 == 0 else "1-0"), status
+            else:
+                outcome = "1/2-1/2", status
+            break
+        if len(san_moves) >= max_plies:
+            outcome = ("*", "ply limit")
+            break
+        moves = None
+        if engine is None or len(san_moves) < random_plies:
+            moves = generate_legal_moves(position)
+            move = rng.choice(moves)
+        else:
+            move = engine.search(position, depth).pv[0]
+        san_moves.append(move_to_san(position, move, moves))
+        make_move(position, move)
+
+    result, termination = outcome
+    headers = {
+        "Event": f"Self-play {mode}",
+        "Round": str(index + 1),
+        "White": mode,
+        "Black": mode,
+        "Result": result,
+        "Seed": str(seed),
+        "Termination": termination,
+    }
+    if fen != START_FEN:
+        headers["SetUp"] = "1"
+        headers["FEN"] = fen
+    return {
+        "index": index,
+        "result": result,
+        "termination": termination,
+        "plies": len(san_moves),
+        "pgn": format_pgn(san_moves, result, headers, first_turn),
+    }
+
+
+def _play_job(job):
+    return play_game(*job)
+
+
+def run_selfplay(games, workers, seed, out, mode="random", fen=START_FEN, depth=2, random_plies=0, max_plies=400):
+    """Play `games` games over `workers` processes, writing PGN to `out` in game order.
+
+    Returns a summary dict with timing, result distribution and average length.
+    """
+    jobs = [(i, seed + i, mode, fen, depth, random_plies, max_plies) for i in range(games)]
+    results = Counter()
+    terminations = Counter()
+    total_plies = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers) as pool:
+        # imap-style: results arrive in submission order, so output is reproducible
+        for game in pool.map(_play_job, jobs, chunksize=max(1, games // (workers * 8))):
+            out.write(game["pgn"])
+            out.write("\n")
+            results[game["result"]] += 1
+            terminations[game["termination"]] += 1
+            total_plies += game["plies"]
+    elapsed = time.perf_counter() - start
+    return {
+        "games": games,
+        "seconds": elapsed,
+        "games_per_sec": games / elapsed if elapsed > 0 else 0.0,
+        "results": dict(results),
+        "terminations": dict(terminations),
+        "average_plies": total_plies / games if games else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless batch self-play")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mode", choices=("random", "engine"), default="random")
+    parser.add_argument("--depth", type=int, default=2, help="engine search depth per move")
+    parser.add_argument("--random-plies", type=int, default=0,
+                        help="play this many random plies before the engine takes over")
+    parser.add_argument("--max-plies", type=int, default=400)
+    parser.add_argument("--fen", default=START_FEN)
+    parser.add_argument("-o", "--output", help="PGN file to write; default is stdout")
+    args = parser.parse_args(argv)
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        summary = run_selfplay(args.games, args.workers, args.seed, out, args.mode, args.fen,
+                               args.depth, args.random_plies, args.max_plies)
+    finally:
+        if args.output:
+            out.close()
+
+    report = sys.stderr
+    print(f"{summary['games']} games in {summary['seconds']:.2f}s "
+          f"({summary['games_per_sec']:.2f} games/sec), average length {summary['average_plies']:.1f} plies",
+          file=report)
+    for result in ("1-0", "0-1", "1/2-1/2", "*"):
+        count = summary["results"].get(result, 0)
+        print(f"  {result:<8} {count:>6}  {100 * count / max(summary['games'], 1):5.1f}%", file=report)
+    for termination, count in sorted(summary["terminations"].items(), key=lambda item: -item[1]):
+        print(f"  {termination:<22} {count:>6}", file=report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+Endgame tablebases
+Retrograde analysis for king and one piece against a lone king (KQK, KRK and
+KPK). Every position of a signature is enumerated once with the normal move
+generator, then results are propagated backwards from the mates: a position
+wins as soon as one move reaches a lost position, and loses once every move
+reaches a won one.
+
+Each table is a flat file of one byte per position, indexed by the squares of
+the two kings, the piece and the side to move, with the stronger side as white.
+Pawnless tables keep the white king in the a1-d1-d4 triangle and KPK keeps it on
+files a-d, so mirrored positions share an entry. Byte 0 is a draw, 255 an
+unreachable position, and any other value is 1 + plies to mate: odd plies mean
+the side to move mates, even plies that it gets mated. Probes read the files
+through mmap.
+
+    python tablebase.py generate
+    python tablebase.py probe --fen "8/8/8/4k3/8/8/8/4KQ2 w - - 0 1"
+"""
+import argparse
+import mmap
+import os
+import sys
+import time
+from array import array
+
+from attacks import KING_ATTACKS
+from pieces import generate_legal_moves, look_for_check
+from position import Position, WHITE, BLACK, PAWN, ROOK, QUEEN, KING, make_piece
+
+SIGNATURES = ("KQK", "KRK", "KPK")
+TABLEBASE_DIR = "tablebases"
+
+DRAW = 0
+INVALID = 255
+_UNKNOWN = 254
+
+WIN = 1
+LOSS = -1
+
+_SIGNATURE_PIECES = {"KQK": QUEEN, "KRK": ROOK, "KPK": PAWN}
+_PIECE_LETTERS = {QUEEN: "Q", ROOK: "R", PAWN: "P"}
+
+
+def _transpose(sq):
+    # Reflect in the a1-h8 diagonal
+    row, col = divmod(sq, 8)
+    return (7 - col) * 8 + (7 - row)
+
+
+_SYMMETRIES = []
+for _flip_col in (0, 7):
+    for _flip_row in (0, 56):
+        for _diagonal in (False, True):
+            _SYMMETRIES.append(tuple((_transpose(sq) if _diagonal else sq) ^ _flip_col ^ _flip_row
+                                     for sq in range(64)))
+
+# The ten white king squares of the pawnless tables: a1-d1-d4, rank <= file <= d
+TRIANGLE = tuple(sq for sq in range(64) if 7 - sq // 8 <= sq % 8 <= 3)
+_TRIANGLE_INDEX = [-1] * 64
+for _i, _sq in enumerate(TRIANGLE):
+    _TRIANGLE_INDEX[_sq] = _i
+
+# Symmetry that brings a white king on each square into the triangle
+_PAWNLESS_MAP = [next(sym for sym in _SYMMETRIES if _TRIANGLE_INDEX[sym[sq]] >= 0) for sq in range(64)]
+
+TABLE_SIZES = {"KQK": len(TRIANGLE) * 64 * 64 * 2, "KRK": len(TRIANGLE) * 64 * 64 * 2, "KPK": 32 * 64 * 48 * 2}
+
+del _flip_col, _flip_row, _diagonal, _i, _sq
+
+
+def table_index(signature, wk, bk, piece, stm):
+    """Index of the position with the strong side as white; `stm` is 0 for white to move."""
+    if signature == "KPK":
+        if wk & 7 > 3:
+            wk ^= 7
+            bk ^= 7
+            piece ^= 7
+        return ((((wk >> 3) * 4 + (wk & 7)) * 64 + bk) * 48 + piece - 8) * 2 + stm
+    sym = _PAWNLESS_MAP[wk]
+    return ((_TRIANGLE_INDEX[sym[wk]] * 64 + sym[bk]) * 64 + sym[piece]) * 2 + stm
+
+
+def _enumerate(signature):
+    """Yield (wk, bk, piece, stm) in index order."""
+    if signature == "KPK":
+        kings = [row * 8 + col for row in range(8) for col in range(4)]
+        pieces = range(8, 56)
+    else:
+        kings = TRIANGLE
+        pieces = range(64)
+    for wk in kings:
+        for bk in range(64):
+            for piece in pieces:
+                yield wk, bk, piece, WHITE
+                yield wk, bk, piece, BLACK
+
+
+def generate(signature, solved=None):
+    """Solve `signature`; returns (table bytearray, stats dict).
+
+    `solved` maps signatures to finished tables; KPK needs KQK and KRK for
+    promotions.
+    """
+    start = time.perf_counter()
+    size = TABLE_SIZES[signature]
+    ptype = _SIGNATURE_PIECES[signature]
+    strong = make_piece(WHITE, ptype)
+    white_king = make_piece(WHITE, KING)
+    black_king = make_piece(BLACK, KING)
+    values = bytearray([INVALID]) * size
+    remaining = array("H", bytes(2 * size))
+    parents = [[] for _ in range(size)]
+    # levels[d]: positions that are mate in d plies; promotions[d]: positions with a promotion into one
+    levels = [[] for _ in range(INVALID)]
+    promotions = [[] for _ in range(INVALID)]
+
+    for index, (wk, bk, piece, stm) in enumerate(_enumerate(signature)):
+        if wk == bk or piece == wk or piece == bk or bk in KING_ATTACKS[wk]:
+            continue
+        board = bytearray(64)
+        board[wk] = white_king
+        board[bk] = black_king
+        board[piece] = strong
+        position = Position(board, stm, castling=0)
+        if look_for_check(position, stm ^ 1):
+            continue
+        moves = generate_legal_moves(position)
+        if not moves:
+            if look_for_check(position, stm):
+                values[index] = 1
+                levels[0].append(index)
+            else:
+                values[index] = DRAW
+            continue
+        values[index] = _UNKNOWN
+        remaining[index] = len(moves)
+        for move in moves:
+            from_sq = move & 63
+            to_sq = (move >> 6) & 63
+            promotion = move >> 12
+            if to_sq == piece:
+                # The lone king takes the piece: a dead draw
+                continue
+            new_wk = to_sq if from_sq == wk else wk
+            new_bk = to_sq if from_sq == bk else bk
+            new_piece = to_sq if from_sq == piece else piece
+            if promotion:
+                target = {QUEEN: "KQK", ROOK: "KRK"}.get(promotion)
+                # Minor piece promotions cannot force mate
+                if target is not None:
+                    value = solved[target][table_index(target, new_wk, new_bk, new_piece, BLACK)]
+                    if value != DRAW:
+                        promotions[value - 1].append(index)
+                continue
+            parents[table_index(signature, new_wk, new_bk, new_piece, stm ^ 1)].append(index)
+
+    for plies in range(_UNKNOWN - 2):
+        # Everything found here is mate in `plies`; its parents resolve at plies + 1
+        child_lost = plies % 2 == 0
+        found = levels[plies + 1]
+        for parent in [parent for child in levels[plies] for parent in parents[child]] + promotions[plies]:
+            if values[parent] != _UNKNOWN:
+                continue
+            if not child_lost:
+                remaining[parent] -= 1
+                if remaining[parent]:
+                    continue
+            values[parent] = plies + 2
+            found.append(parent)
+
+    wins = losses = draws = 0
+    longest = 0
+    for index, value in enumerate(values):
+        if value == _UNKNOWN:
+            values[index] = value = DRAW
+        if value == DRAW:
+            draws += 1
+        elif value != INVALID:
+            if value % 2 == 0:
+                wins += 1
+            else:
+                losses += 1
+            longest = max(longest, value - 1)
+    stats = {
+        "signature": signature,
+        "positions": size,
+        "wins": wins,
+        "draws": draws,
+        "losses": losses,
+        "invalid": size - wins - draws - losses,
+        "longest_mate_plies": longest,
+        "seconds": time.perf_counter() - start,
+    }
+    return values, stats
+
+
+def generate_all(directory=TABLEBASE_DIR, signatures=SIGNATURES):
+    """Generate and write each signature in order; returns the list of stats dicts."""
+    os.makedirs(directory, exist_ok=True)
+    solved = {}
+    all_stats = []
+    for signature in signatures:
+        if signature == "KPK":
+            for needed in ("KQK", "KRK"):
+                if needed not in solved:
+                    solved[needed] = _load(os.path.join(directory, f"{needed}.tb")) or generate(needed)[0]
+        table, stats = generate(signature, solved)
+        solved[signature] = table
+        path = os.path.join(directory, f"{signature}.tb")
+        with open(path, "wb") as out:
+            out.write(table)
+        stats["bytes"] = os.path.getsize(path)
+        all_stats.append(stats)
+    return all_stats
+
+
+def _load(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return bytearray(f.read())
+
+
+class Tablebases:
+    """Memory-mapped probes into the tables found in `directory`."""
+
+    def __init__(self, directory=TABLEBASE_DIR):
+        self.tables = {}
+        self._files = []
+        for signature in SIGNATURES:
+            path = os.path.join(directory, f"{signature}.tb")
+            if not os.path.exists(path) or os.path.getsize(path) != TABLE_SIZES[signature]:
+                continue
+            f = open(path, "rb")
+            self._files.append(f)
+            self.tables[signature] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.tables)
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        for f in self._files:
+            f.close()
+        self.tables = {}
+        self._files = []
+
+    def probe(self, position):
+        """Return (result, plies to mate) for the side to move, or None if no table covers it.
+
+        result is WIN, DRAW or LOSS; plies is 0 for draws.
+        """
+        board = position.board
+        if position.castling or board.count(0) != 61:
+            return None
+        kings = [0, 0]
+        strong = None
+        for sq, piece in enumerate(board):
+            if not piece:
+                continue
+            if piece & 7 == KING:
+                kings[piece >> 3] = sq
+            elif strong is None:
+                strong = (sq, piece)
+            else:
+                return None
+        if strong is None:
+            return None
+        sq, piece = strong
+        signature = f"K{_PIECE_LETTERS.get(piece & 7, '?')}K"
+        table = self.tables.get(signature)
+        if table is None:
+            return None
+        color = piece >> 3
+        wk, bk = kings[color], kings[color ^ 1]
+        if color == BLACK:
+            # Swap colors by mirroring the ranks, so the strong side is white
+            wk, bk, sq = wk ^ 56, bk ^ 56, sq ^ 56
+        value = table[table_index(signature, wk, bk, sq, (position.turn & 1) ^ color)]
+        if value == INVALID:
+            return None
+        if value == DRAW:
+            return DRAW, 0
+        return (WIN if value % 2 == 0 else LOSS), value - 1
+
+    def probe_score(self, position, ply, mate):
+        """Return a search score for `position` at `ply`, with mates scored like the search's, or None."""
+        found = self.probe(position)
+        if found is None:
+            return None
+        result, plies = found
+        if result == DRAW:
+            return 0
+        return mate - ply - plies if result == WIN else -(mate - ply - plies)
+
+
+def open_tablebases(directory=TABLEBASE_DIR):
+    """Return Tablebases for `directory`, or None when it holds no tables."""
+    tablebases = Tablebases(directory)
+    return tablebases if len(tablebases) else None
+
+
+def format_result(found, turn):
+    """Describe a probe result for the side to move as text, e.g. 'White mates in 5'."""
+    if found is None:
+        return "Not in tablebase"
+    result, plies = found
+    if result == DRAW:
+        return "Draw"
+    mover = "White" if turn & 1 == WHITE else "Black"
+    other = "Black" if mover == "White" else "White"
+    winner = mover if result == WIN else other
+    if plies == 0:
+        return f"{winner} has mated"
+    return f"{winner} mates in {(plies + 1) // 2}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate and probe endgame tablebases")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("generate", help="solve signatures by retrograde analysis")
+    build.add_argument("signatures", nargs="*", metavar="SIGNATURE", help="KQK, KRK or KPK (default: all)")
+    build.add_argument("--dir", default=TABLEBASE_DIR)
+    probe = commands.add_parser("probe", help="look up a position")
+    probe.add_argument("--fen", required=True)
+    probe.add_argument("--dir", default=TABLEBASE_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        unknown = set(args.signatures) - set(SIGNATURES)
+        if unknown:
+            parser.error(f"unknown signature: {', '.join(sorted(unknown))}")
+        for stats in generate_all(args.dir, args.signatures or SIGNATURES):
+            print(f"{stats['signature']}: {stats['positions']} positions in {stats['seconds']:.1f}s, "
+                  f"{stats['bytes']} bytes ({stats['bytes'] / stats['positions']:.2f} bytes/position); "
+                  f"{stats['wins']} won, {stats['draws']} drawn, {stats['losses']} lost, "
+                  f"{stats['invalid']} unreachable; longest mate {stats['longest_mate_plies']} plies")
+        return 0
+
+    tablebases = Tablebases(args.dir)
+    position = Position.from_fen(args.fen)
+    print(format_result(tablebases.probe(position), position.turn))
+    tablebases.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
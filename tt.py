@@ -0,0 +1,109 @@
+"""
+Transposition table
+Fixed-size hash table keyed by Zobrist key. Memory is allocated once up front
+and never grows, however long a search runs.
+
+Each bucket holds two entries: a depth-preferred slot that keeps the deepest
+result seen for the bucket (unless it is from an older search), and an
+always-replace slot that takes everything else.
+"""
+from array import array
+
+EXACT = 0
+LOWER = 1  # score is a lower bound (fail high)
+UPPER = 2  # score is an upper bound (fail low)
+
+_SCORE_OFFSET = 1 << 23
+_ENTRY_BYTES = 16  # one key word and one data word
+
+
+class TranspositionTable:
+    __slots__ = ("size_mb", "mask", "keys", "data", "generation", "hits", "misses", "collisions", "stores")
+
+    def __init__(self, size_mb=16):
+        buckets = 1
+        while buckets * 2 * 2 * _ENTRY_BYTES <= size_mb * 1024 * 1024:
+            buckets *= 2
+        self.size_mb = size_mb
+        self.mask = buckets - 1
+        # Slot 2 * i is the depth-preferred entry of bucket i, slot 2 * i + 1 the always-replace one
+        self.keys = array("Q", bytes(8 * 2 * buckets))
+        self.data = array("Q", bytes(8 * 2 * buckets))
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def clear(self):
+        size = len(self.keys)
+        self.keys = array("Q", bytes(8 * size))
+        self.data = array("Q", bytes(8 * size))
+        self.generation = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = self.misses = self.collisions = self.stores = 0
+
+    def new_search(self):
+        """Age existing entries so the depth-preferred slots can be reclaimed."""
+        self.generation = (self.generation + 1) & 63
+
+    def probe(self, key):
+        """Return (move, depth, flag, score) stored for `key`, or None."""
+        slot = (key & self.mask) << 1
+        keys = self.keys
+        if keys[slot] == key:
+            self.hits += 1
+            return _unpack(self.data[slot])
+        if keys[slot + 1] == key:
+            self.hits += 1
+            return _unpack(self.data[slot + 1])
+        self.misses += 1
+        # The bucket is holding other positions that share its index
+        if self.data[slot] or self.data[slot + 1]:
+            self.collisions += 1
+        return None
+
+    def store(self, key, move, depth, flag, score):
+        slot = (key & self.mask) << 1
+        word = (move | depth << 16 | flag << 24 | self.generation << 26
+                | (score + _SCORE_OFFSET) << 32)
+        old = self.data[slot]
+        if (self.keys[slot] == key or not old or depth >= (old >> 16) & 255
+                or (old >> 26) & 63 != self.generation):
+            slot_key = self.keys[slot]
+            # Keep a fresh but shallower previous occupant in the always-replace slot
+            if old and slot_key != key:
+                self.keys[slot + 1] = slot_key
+                self.data[slot + 1] = old
+        else:
+            slot += 1
+        self.keys[slot] = key
+        self.data[slot] = word
+        self.stores += 1
+
+    def hashfull(self):
+        """Return the per-mille of sampled entries written during the current search."""
+        sample = min(len(self.data), 2000)
+        used = sum(1 for word in self.data[:sample] if word and (word >> 26) & 63 == self.generation)
+        return used * 1000 // sample
+
+    def stats(self):
+        probes = self.hits + self.misses
+        return {
+            "entries": len(self.keys),
+            "size_mb": self.size_mb,
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "hit_rate": self.hits / probes if probes else 0.0,
+        }
+
+
+def _unpack(word):
+    return word & 0xFFFF, (word >> 16) & 255, (word >> 24) & 3, ((word >> 32) & 0xFFFFFF) - _SCORE_OFFSET
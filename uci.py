@@ -0,0 +1,445 @@
+"""
+UCI
+The engine as a separate process speaking the UCI protocol on stdin/stdout, and
+the client the GUI uses to drive it without blocking its frame loop.
+
+The protocol loop keeps reading commands while a search runs in a worker
+thread, so `stop` and `isready` are answered at once. A `go infinite` or
+`go ponder` search that ends on its own (a proven mate, the maximum depth)
+holds its bestmove until `stop` or `ponderhit`, as the protocol requires.
+bestmove names the expected reply (`bestmove e2e4 ponder e7e5`). `go ponder`
+searches the position after that reply with the time limit on hold; on
+`ponderhit` the same search carries on under the limit, with the time spent
+pondering already counted, so a long think by the opponent means an instant
+move. Any UCI GUI can load it:
+
+    python uci.py
+    python uci.py --check-ponder     # reply times with and without a ponderhit
+
+EngineProcess starts that process and reads its output on a background thread
+into a queue; the GUI calls go() and then poll() once per frame. go() without a
+movetime searches until stopped, which the GUI uses to analyse: the lines of
+the running search are collected in EngineProcess.lines by rank, and the
+engine keeps its transposition table from one search to the next.
+"""
+import argparse
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from book import open_book
+from engine import Engine, MAX_PLY, format_info
+from pieces import generate_legal_moves
+from position import Position, START_FEN, make_move, unmake_move, move_uci, parse_uci
+from tablebase import open_tablebases
+
+ENGINE_NAME = "Chess-Game"
+ENGINE_AUTHOR = "GOATofgoat"
+
+# Share of the remaining clock spent on one move when the GUI sends wtime/btime
+MOVES_TO_GO = 30
+
+# Upper limits of the spin options advertised in answer to "uci"
+MAX_HASH_MB = 1024
+MAX_MULTIPV = 16
+
+# One line of analysis from an info message; exactly one of cp and mate is set
+AnalysisLine = namedtuple("AnalysisLine", "multipv depth cp mate nps pv")
+
+
+def parse_info(line):
+    """Parse an `info ... pv ...` line into an AnalysisLine, or None if it carries no line."""
+    tokens = line.split()
+    if "pv" not in tokens or "score" not in tokens:
+        return None
+    values = {"multipv": 1, "depth": 0, "cp": None, "mate": None, "nps": 0}
+    index = 1
+    while index < len(tokens) - 1:
+        token = tokens[index]
+        if token == "pv":
+            break
+        if token == "score":
+            index += 1
+            token = tokens[index]
+        if token in values:
+            values[token] = int(tokens[index + 1])
+            index += 2
+        else:
+            index += 1
+    try:
+        pv = [parse_uci(text) for text in tokens[tokens.index("pv") + 1:]]
+    except ValueError:
+        return None
+    return AnalysisLine(values["multipv"], values["depth"], values["cp"], values["mate"], values["nps"], pv)
+
+
+class UCIEngine:
+    """Protocol handler: feed it command lines with handle()."""
+
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.hash_mb = 16
+        self.multipv = 1
+        # In analysis mode the book is left alone so every position gets searched
+        self.analyse_mode = False
+        self.book = None
+        self.engine = Engine(self.hash_mb)
+        self.position = Position.starting()
+        self.thread = None
+        # Set by stop and ponderhit; an infinite search waits on it before sending bestmove
+        self._released = threading.Event()
+        self._lock = threading.Lock()
+
+    def send(self, line):
+        with self._lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def handle(self, line):
+        """Process one command; returns False on quit."""
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {self.hash_mb} min 1 max {MAX_HASH_MB}")
+            self.send("option name BookFile type string default <empty>")
+            self.send("option name TablebasePath type string default <empty>")
+            self.send("option name EvalFile type string default <empty>")
+            self.send(f"option name MultiPV type spin default 1 min 1 max {MAX_MULTIPV}")
+            self.send("option name UCI_AnalyseMode type check default false")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self._set_option(args)
+        elif command == "ucinewgame":
+            self._stop_search()
+            self.engine.new_game()
+            self.position = Position.starting()
+        elif command == "position":
+            self._stop_search()
+            self._set_position(args)
+        elif command == "go":
+            self._stop_search()
+            self._go(args)
+        elif command == "stop":
+            self._stop_search()
+        elif command == "ponderhit":
+            # The opponent played the expected move: the ponder search becomes the real one
+            self.engine.pondering = False
+            self._released.set()
+        elif command == "quit":
+            self._stop_search()
+            return False
+        return True
+
+    def _set_option(self, args):
+        text = " ".join(args)
+        if not text.startswith("name ") or " value " not in text:
+            return
+        name, value = text[5:].split(" value ", 1)
+        name = name.strip().lower()
+        value = value.strip()
+        if name in ("hash", "multipv"):
+            try:
+                number = int(value)
+            except ValueError:
+                self.send(f"info string invalid value {value} for {name}")
+                return
+        if name == "hash":
+            self.hash_mb = min(max(1, number), MAX_HASH_MB)
+            self.engine = Engine(self.hash_mb, self.book, self.engine.tablebases, self.engine.network)
+        elif name == "bookfile":
+            self.book = open_book(value)
+            if value and value != "<empty>" and self.book is None:
+                self.send(f"info string no opening book at {value}")
+        elif name == "tablebasepath":
+            self.engine.tablebases = open_tablebases(value) if value and value != "<empty>" else None
+            if value and value != "<empty>" and self.engine.tablebases is None:
+                self.send(f"info string no tablebases in {value}")
+        elif name == "evalfile":
+            self.engine.network = None
+            if value and value != "<empty>":
+                # NumPy is only loaded once a network is asked for
+                from nnue import open_network
+                self.engine.network = open_network(value)
+                if self.engine.network is None:
+                    self.send(f"info string no NNUE weights at {value}")
+        elif name == "multipv":
+            self.multipv = min(max(1, number), MAX_MULTIPV)
+        elif name == "uci_analysemode":
+            self.analyse_mode = value.lower() == "true"
+
+    def _set_position(self, args):
+        if "moves" in args:
+            split = args.index("moves")
+            setup, moves = args[:split], args[split + 1:]
+        else:
+            setup, moves = args, []
+        try:
+            if setup[:1] == ["fen"]:
+                position = Position.from_fen(" ".join(setup[1:]))
+            else:
+                position = Position.from_fen(START_FEN)
+        except ValueError:
+            self.send("info string invalid fen")
+            return
+        for text in moves:
+            try:
+                move = parse_uci(text)
+            except ValueError:
+                move = None
+            if move not in generate_legal_moves(position):
+                self.send(f"info string illegal move {text}")
+                break
+            make_move(position, move)
+        self.position = position
+
+    def _go(self, args):
+        options = {}
+        index = 0
+        while index < len(args):
+            if args[index] in ("infinite", "ponder"):
+                options[args[index]] = True
+                index += 1
+            elif index + 1 < len(args):
+                options[args[index]] = args[index + 1]
+                index += 2
+            else:
+                index += 1
+
+        depth = int(options.get("depth", MAX_PLY - 1))
+        movetime = None
+        if "movetime" in options:
+            movetime = int(options["movetime"]) / 1000
+        elif not options.get("infinite"):
+            white = self.position.side_to_move == 0
+            clock = options.get("wtime" if white else "btime")
+            if clock is not None:
+                increment = int(options.get("winc" if white else "binc", 0))
+                moves_to_go = int(options.get("movestogo", MOVES_TO_GO))
+                budget = int(clock) / max(moves_to_go, 1) + increment * 3 // 4
+                movetime = max(min(budget, int(clock) - 50), 10) / 1000
+
+        self.engine.book = None if self.analyse_mode else self.book
+        position = self.position.copy()
+        infinite = bool(options.get("infinite") or options.get("ponder"))
+        # Set here, before the worker starts, so a stop or ponderhit that arrives at once is not lost
+        self.engine.stopped = False
+        self.engine.pondering = bool(options.get("ponder"))
+        self._released.clear()
+        self.thread = threading.Thread(target=self._search, args=(position, depth, movetime, infinite),
+                                       daemon=True)
+        self.thread.start()
+
+    def _search(self, position, depth, movetime, infinite):
+        info = self.engine.search(position, depth, movetime,
+                                  on_iteration=lambda info: self.send(format_info(info)), multipv=self.multipv)
+        if infinite:
+            self._released.wait()
+        self.engine.pondering = False
+        if not info.pv:
+            self.send("bestmove 0000")
+        elif len(info.pv) > 1:
+            self.send(f"bestmove {move_uci(info.pv[0])} ponder {move_uci(info.pv[1])}")
+        else:
+            self.send(f"bestmove {move_uci(info.pv[0])}")
+
+    def _stop_search(self):
+        if self.thread is not None:
+            self.engine.stop()
+            self._released.set()
+            self.thread.join()
+            self.thread = None
+
+
+class EngineProcess:
+    """Runs uci.py as a child process; all calls return immediately."""
+
+    def __init__(self, options=None, command=None):
+        if command is None:
+            command = [sys.executable, os.path.abspath(__file__)]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        text=True, bufsize=1)
+        self.output = queue.Queue()
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.reader.start()
+        self.thinking = False
+        self.last_info = None
+        # The reply the engine expects to its last move, from `bestmove ... ponder ...`
+        self.ponder_move = None
+        # Latest AnalysisLine of the current search per rank, and a counter bumped when one changes
+        self.lines = {}
+        self.lines_version = 0
+        # bestmove replies still owed for searches that were stopped and should be ignored
+        self._stale = 0
+        self.send("uci")
+        for name, value in (options or {}).items():
+            self.set_option(name, value)
+        self.send("isready")
+
+    def _read(self):
+        for line in self.process.stdout:
+            self.output.put(line.strip())
+        self.output.put(None)
+
+    def send(self, line):
+        self.process.stdin.write(line + "\n")
+        self.process.stdin.flush()
+
+    def set_option(self, name, value):
+        """Set a UCI option; it applies from the next go()."""
+        self.send(f"setoption name {name} value {value}")
+
+    def go(self, position, movetime=None, ponder=None):
+        """Start searching `position` for `movetime` seconds, or until stopped when it is None.
+
+        With `ponder`, the opponent's expected move in `position`, the engine
+        searches the position after it on the opponent's time; ponderhit()
+        then turns that into the search for the move, or stop() drops it. The
+        answer arrives through poll(). An open-ended search only ends on its
+        own when it proves a mate or reaches the maximum depth.
+        """
+        if self.thinking:
+            self.stop()
+        # Send the game from its first position so the engine sees the repetition history
+        root = position.copy()
+        while root.stack:
+            unmake_move(root)
+        history = position.history() + ([ponder] if ponder else [])
+        moves = " ".join(move_uci(move) for move in history)
+        self.send(f"position fen {root.fen()}" + (f" moves {moves}" if moves else ""))
+        if movetime is None:
+            self.send("go ponder" if ponder else "go infinite")
+        else:
+            self.send(("go ponder" if ponder else "go") + f" movetime {int(movetime * 1000)}")
+        self.thinking = True
+        self.lines = {}
+        self.lines_version += 1
+
+    def ponderhit(self):
+        """The expected move was played: the ponder search goes on as the search for the engine's move."""
+        if self.thinking:
+            self.send("ponderhit")
+
+    def stop(self):
+        """Abandon the current search; its bestmove will be discarded."""
+        if self.thinking:
+            self.send("stop")
+            self._stale += 1
+            self.thinking = False
+
+    def poll(self):
+        """Drain pending output; returns the best move of the current search once it is known, else None."""
+        while True:
+            try:
+                line = self.output.get_nowait()
+            except queue.Empty:
+                return None
+            if line is None:
+                self.thinking = False
+                return None
+            if line.startswith("info ") and " pv " in line:
+                if self._stale:
+                    # Still the output of a search that was stopped
+                    continue
+                self.last_info = line
+                analysis = parse_info(line)
+                if analysis is not None:
+                    self.lines[analysis.multipv] = analysis
+                    self.lines_version += 1
+            elif line.startswith("bestmove"):
+                if self._stale:
+                    self._stale -= 1
+                    continue
+                self.thinking = False
+                tokens = line.split()
+                self.ponder_move = parse_uci(tokens[3]) if tokens[2:3] == ["ponder"] and len(tokens) > 3 else None
+                return None if tokens[1] == "0000" else parse_uci(tokens[1])
+
+    def close(self):
+        if self.process.poll() is None:
+            try:
+                self.send("quit")
+                self.process.wait(timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+
+
+def _wait_for_move(engine, timeout=30.0):
+    """Poll `engine` until its search answers; returns (move, seconds waited)."""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        move = engine.poll()
+        if move is not None:
+            return move, time.perf_counter() - start
+        time.sleep(0.002)
+    raise TimeoutError("the engine did not answer")
+
+
+def check_ponder(movetime=1.0, think=2.0, plies=6):
+    """Time the engine's replies with and without a ponderhit; returns (plain, pondered) averages in seconds.
+
+    Both runs play the same game: the engine moves, the opponent answers with
+    the move the engine expected, and the engine replies. Without pondering
+    that reply is a fresh `go movetime`; with it the engine has searched the
+    position for `think` seconds and only needs the ponderhit.
+    """
+    averages = []
+    for ponder in (False, True):
+        engine = EngineProcess()
+        position = Position.starting()
+        times = []
+        try:
+            engine.go(position, movetime)
+            move, _ = _wait_for_move(engine)
+            for _ in range(plies):
+                make_move(position, move)
+                expected = engine.ponder_move
+                if expected is None or expected not in generate_legal_moves(position):
+                    break
+                if ponder:
+                    engine.go(position, movetime, ponder=expected)
+                    time.sleep(think)
+                    make_move(position, expected)
+                    engine.ponderhit()
+                else:
+                    time.sleep(think)
+                    make_move(position, expected)
+                    engine.go(position, movetime)
+                move, waited = _wait_for_move(engine)
+                times.append(waited)
+        finally:
+            engine.close()
+        averages.append(sum(times) / len(times) if times else movetime)
+    return tuple(averages)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="UCI engine on stdin/stdout")
+    parser.add_argument("--check-ponder", action="store_true",
+                        help="check that a ponderhit answers faster than a fresh search")
+    parser.add_argument("--movetime", type=float, default=1.0, help="seconds per move for --check-ponder")
+    args = parser.parse_args(argv)
+
+    if args.check_ponder:
+        plain, pondered = check_ponder(args.movetime)
+        print(f"reply after the expected move: {plain:.3f}s without pondering, {pondered:.3f}s with a ponderhit")
+        return 0 if pondered < plain / 2 else 1
+
+    protocol = UCIEngine()
+    for line in sys.stdin:
+        if not protocol.handle(line.strip()):
+            break
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
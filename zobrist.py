@@ -0,0 +1,34 @@
+"""
+Zobrist hashing
+64-bit random keys for piece placement, side to move, castling rights and the
+en passant file. Position keeps its key up to date incrementally in make_move
+and unmake_move; compute_key rebuilds it from scratch.
+"""
+import random
+
+# Fixed seed so every process (and every run) agrees on the keys
+_rng = random.Random(0x5EED_C0DE)
+
+# Indexed by piece code (type | color << 3) then square; unused codes stay zero
+PIECE_KEYS = [[0] * 64 for _ in range(16)]
+for _code in (1, 2, 3, 4, 5, 6, 9, 10, 11, 12, 13, 14):
+    PIECE_KEYS[_code] = [_rng.getrandbits(64) for _ in range(64)]
+
+SIDE_KEY = _rng.getrandbits(64)
+CASTLING_KEYS = [_rng.getrandbits(64) for _ in range(16)]
+EP_FILE_KEYS = [_rng.getrandbits(64) for _ in range(8)]
+
+del _code
+
+
+def compute_key(position):
+    key = 0
+    for sq, piece in enumerate(position.board):
+        if piece:
+            key ^= PIECE_KEYS[piece][sq]
+    if position.turn & 1:
+        key ^= SIDE_KEY
+    key ^= CASTLING_KEYS[position.castling]
+    if position.ep_square >= 0:
+        key ^= EP_FILE_KEYS[position.ep_square & 7]
+    return key